@@ -1,15 +1,78 @@
 from sqlalchemy         import create_engine
 from flask              import Flask
-from model              import UserDao, TweetDao
-from service            import UserService, TweetService
+from model              import UserDao, TweetDao, TimelineDao, InstrumentedQueuePool, warm_up_pool, EngineRouter
+from model.statements   import create_compiled_cache
+from service            import UserService, TweetService, LocalTimelineCache, RemoteTimelineCache, PasswordHasher, FollowGraph
 from view               import create_endpoints
-import boto3
-import config
+from metrics            import Registry, instrument_dao, stats_collector
+from functools          import partial
+import threading
 
 class Services:
     pass
 
 
+class LazyClient:
+    # builds the wrapped client on first attribute access
+    def __init__(self, factory):
+        self.factory    = factory
+        self.client     = None
+        self.lock       = threading.Lock()
+
+    def __getattr__(self, name):
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = self.factory()
+        return getattr(self.client, name)
+
+
+def create_s3_client(config):
+    import boto3
+
+    return boto3.client(
+        's3',
+        aws_access_key_id       = config['S3_ACCESS_KEY'],
+        aws_secret_access_key   = config['S3_SECRET_KEY']
+    )
+
+
+def create_timeline_cache(config):
+    backend = config.get('TIMELINE_CACHE')
+
+    if backend == 'local':
+        return LocalTimelineCache(
+            maxsize             = config.get('TIMELINE_CACHE_SIZE', 10000),
+            ttl                 = config.get('TIMELINE_CACHE_TTL', 30),
+            versions_maxsize    = config.get('TIMELINE_CACHE_VERSIONS_SIZE')
+        )
+    if backend == 'remote':
+        return RemoteTimelineCache(
+            config['TIMELINE_CACHE_CLIENT'],
+            ttl     = config.get('TIMELINE_CACHE_TTL', 30)
+        )
+    return None
+
+
+def create_database(db_url, config):
+    database = create_engine(
+        db_url,
+        encoding        = 'utf-8',
+        poolclass       = InstrumentedQueuePool,
+        pool_size       = config.get('DB_POOL_SIZE', 5),
+        max_overflow    = config.get('DB_MAX_OVERFLOW', 0),
+        pool_timeout    = config.get('DB_POOL_TIMEOUT', 30),
+        pool_recycle    = config.get('DB_POOL_RECYCLE', -1),
+        pool_pre_ping   = config.get('DB_POOL_PRE_PING', False),
+        connect_args    = config.get('DB_CONNECT_ARGS', {})
+    ).execution_options(compiled_cache=create_compiled_cache(config.get('DB_COMPILED_CACHE_SIZE', 500)))
+
+    if config.get('DB_POOL_WARM_UP'):
+        warm_up_pool(database, config.get('DB_POOL_SIZE', 5))
+
+    return database
+
+
 def create_app(test_config=None):
     
     app = Flask(__name__)
@@ -19,19 +82,68 @@ def create_app(test_config=None):
     else:
         app.config.update(test_config)
 
-    database = create_engine(app.config['DB_URL'], encoding='utf-8', max_overflow=0)
+    database = create_database(app.config['DB_URL'], app.config)
+    replicas = [create_database(url, app.config) for url in app.config.get('DB_REPLICA_URLS', [])]
+    router   = EngineRouter(
+        database,
+        replicas,
+        strategy            = app.config.get('DB_REPLICA_STRATEGY', 'round_robin'),
+        read_your_writes    = app.config.get('DB_READ_YOUR_WRITES_SECONDS', 5)
+    )
 
-    user_dao    = UserDao(database)
-    tweet_dao   = TweetDao(database)
+    registry            = Registry()
+    slow_query_seconds  = app.config.get('SLOW_QUERY_SECONDS')
 
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id       = app.config['S3_ACCESS_KEY'],
-        aws_secret_access_key   = app.config['S3_SECRET_KEY']
+    user_dao    = instrument_dao(UserDao(router), registry, slow_query_seconds)
+    tweet_dao   = instrument_dao(TweetDao(router), registry, slow_query_seconds)
+    timeline_dao    = instrument_dao(
+        TimelineDao(router, app.config.get('TIMELINE_MAX_LENGTH', 800)),
+        registry,
+        slow_query_seconds
+    ) if app.config.get('TIMELINE_FANOUT') else None
+
+    s3_client       = LazyClient(partial(create_s3_client, app.config))
+    timeline_cache  = create_timeline_cache(app.config)
+    follow_graph    = None
+
+    if app.config.get('FOLLOW_GRAPH'):
+        follow_graph = FollowGraph()
+        follow_graph.load(user_dao.iter_follow_edges())
+        follow_graph.start_reloading(user_dao.iter_follow_edges, app.config.get('FOLLOW_GRAPH_RELOAD_SECONDS', 30))
+    password_hasher = PasswordHasher(
+        rounds      = app.config.get('BCRYPT_ROUNDS', 12),
+        workers     = app.config.get('PASSWORD_HASH_WORKERS', 0),
+        queue_size  = app.config.get('PASSWORD_HASH_QUEUE_SIZE', 0),
+        timeout     = app.config.get('PASSWORD_HASH_TIMEOUT')
     )
+
     services        = Services
-    services.user_service    = UserService(user_dao, app.config, s3_client)
-    services.tweet_service   = TweetService(tweet_dao)
+    services.user_service    = UserService(user_dao, app.config, s3_client, timeline_dao, timeline_cache, password_hasher, follow_graph=follow_graph)
+    services.tweet_service   = TweetService(
+        tweet_dao,
+        timeline_dao,
+        user_dao,
+        timeline_cache,
+        follow_graph,
+        merge_timeline  = app.config.get('TIMELINE_MERGE', False)
+    )
+    services.follow_graph    = follow_graph
+
+    if app.config.get('TWEET_WRITE_BEHIND'):
+        services.tweet_service.enable_write_behind(
+            max_size        = app.config.get('TWEET_BUFFER_SIZE', 10000),
+            batch_size      = app.config.get('TWEET_BUFFER_BATCH_SIZE', 500),
+            flush_interval  = app.config.get('TWEET_BUFFER_FLUSH_INTERVAL', 0.05),
+            ack             = app.config.get('TWEET_BUFFER_ACK', 'flushed'),
+            ack_timeout     = app.config.get('TWEET_BUFFER_ACK_TIMEOUT', 5)
+        )
+    services.timeline_cache  = timeline_cache
+    services.db_pool         = database.pool
+    services.metrics         = registry
+
+    registry.add_collector(database.pool.collect)
+    if timeline_cache:
+        registry.add_collector(stats_collector('timeline_cache', 'Timeline cache', timeline_cache.stats))
 
     create_endpoints(app, services)
 
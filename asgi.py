@@ -0,0 +1,73 @@
+from quart              import Quart
+from functools          import partial
+from model.async_dao    import AsyncUserDao, AsyncTweetDao, create_async_pool
+from service            import AsyncUserService, AsyncTweetService, PasswordHasher, S3Storage
+from view.async_endpoints   import create_async_endpoints
+from metrics            import Registry, stats_collector
+from app                import Services, LazyClient, create_s3_client, create_timeline_cache
+
+# features only the WSGI app implements; serving them here would skip their writes (fan-out rows,
+# follow graph updates) or their limits, so refuse to start instead
+UNSUPPORTED_CONFIG = (
+    'TIMELINE_FANOUT',
+    'TIMELINE_MERGE',
+    'TWEET_WRITE_BEHIND',
+    'FOLLOW_GRAPH',
+    'DB_REPLICA_URLS',
+    'ADMISSION_CONTROL'
+)
+
+
+def create_asgi_app(test_config=None):
+
+    app = Quart(__name__)
+
+    if test_config is None:
+        app.config.from_pyfile('config.py')
+    else:
+        app.config.update(test_config)
+
+    unsupported = [key for key in UNSUPPORTED_CONFIG if app.config.get(key)]
+    if unsupported:
+        raise ValueError(f"the ASGI app does not support {', '.join(unsupported)}")
+
+    registry        = Registry()
+    timeline_cache  = create_timeline_cache(app.config)
+    password_hasher = PasswordHasher(
+        rounds      = app.config.get('BCRYPT_ROUNDS', 12),
+        workers     = app.config.get('PASSWORD_HASH_WORKERS', 0),
+        queue_size  = app.config.get('PASSWORD_HASH_QUEUE_SIZE', 0),
+        timeout     = app.config.get('PASSWORD_HASH_TIMEOUT')
+    )
+    storage         = S3Storage(
+        LazyClient(partial(create_s3_client, app.config)),
+        app.config['S3_BUCKET'],
+        app.config['S3_BUCKET_URL']
+    )
+
+    services                = Services()
+    services.timeline_cache = timeline_cache
+    services.metrics        = registry
+
+    if timeline_cache:
+        registry.add_collector(stats_collector('timeline_cache', 'Timeline cache', timeline_cache.stats))
+
+    @app.before_serving
+    async def open_pool():
+        pool        = await create_async_pool(app.config['DB_URL'], app.config)
+        user_dao    = AsyncUserDao(pool)
+
+        services.db_pool        = pool
+        services.user_service   = AsyncUserService(user_dao, app.config, timeline_cache, password_hasher, storage=storage)
+        services.tweet_service  = AsyncTweetService(AsyncTweetDao(pool), user_dao, timeline_cache)
+
+    @app.after_serving
+    async def close_pool():
+        await services.user_service.shutdown()
+        services.db_pool.close()
+        await services.db_pool.wait_closed()
+        password_hasher.shutdown()
+
+    create_async_endpoints(app, services)
+
+    return app
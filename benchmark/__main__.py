@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+from sqlalchemy     import create_engine
+from .seed          import seed_social_graph, reset_tables, load_follows
+from .load          import run_workload, TestClientDriver, HTTPDriver, DEFAULT_MIX
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        endpoint, weight    = item.split('=')
+        mix[endpoint]       = float(weight)
+    return mix
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark')
+    parser.add_argument('--db-url', default=config.test_config['DB_URL'])
+    parser.add_argument('--url', help='benchmark a running server instead of an in-process app')
+    parser.add_argument('--seed', action='store_true', help='truncate tables and seed a synthetic graph first')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--mean-follows', type=int, default=50)
+    parser.add_argument('--follow-skew', type=float, default=1.1)
+    parser.add_argument('--mean-tweets', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='e.g. login=5,tweet=15,timeline=70,follow=10')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    report  = {}
+    follows = None
+
+    if args.seed:
+        database = create_engine(args.db_url, encoding='utf-8')
+        reset_tables(database)
+        report['seed'] = seed_social_graph(
+            database,
+            users           = args.users,
+            mean_follows    = args.mean_follows,
+            follow_skew     = args.follow_skew,
+            mean_tweets     = args.mean_tweets
+        )
+
+    # the in-process app and a freshly seeded server both use --db-url
+    if args.seed or not args.url:
+        follows = load_follows(create_engine(args.db_url, encoding='utf-8'))
+
+    if args.url:
+        make_driver = lambda: HTTPDriver(args.url)
+    else:
+        from app import create_app
+
+        app         = create_app(dict(config.test_config, DB_URL=args.db_url))
+        make_driver = lambda: TestClientDriver(app)
+
+    report.update(run_workload(
+        make_driver,
+        users       = args.users,
+        concurrency = args.concurrency,
+        duration    = args.duration,
+        mix         = args.mix,
+        follows     = follows
+    ))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+from .load  import percentile_ms
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def summarize(mode, concurrency, latencies, errors, elapsed):
+    latencies = sorted(latencies)
+
+    return {
+        'mode'          : mode,
+        'concurrency'   : concurrency,
+        'requests'      : len(latencies),
+        'errors'        : errors,
+        'rps'           : len(latencies) / elapsed,
+        'p50_ms'        : percentile_ms(latencies, 50),
+        'p99_ms'        : percentile_ms(latencies, 99),
+        'peak_rss_mb'   : peak_rss_mb()
+    }
+
+def run_sync(app_config, users, concurrency, duration):
+    from app import create_app
+
+    app         = create_app(dict(app_config, DB_POOL_SIZE=concurrency))
+    latencies   = []
+    errors      = [0]
+    deadline    = time.perf_counter() + duration
+
+    def worker(seed):
+        client  = app.test_client()
+        rng     = random.Random(seed)
+        while time.perf_counter() < deadline:
+            start   = time.perf_counter()
+            status  = client.get(f"/timeline/{rng.randint(1, users)}").status_code
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    start   = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize('sync', concurrency, latencies, errors[0], time.perf_counter() - start)
+
+def run_async(app_config, users, concurrency, duration):
+    import asyncio
+    from asgi import create_asgi_app
+
+    app         = create_asgi_app(dict(app_config, DB_POOL_SIZE=concurrency))
+    latencies   = []
+    errors      = [0]
+
+    async def worker(client, seed, deadline):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            start   = time.perf_counter()
+            status  = (await client.get(f"/timeline/{rng.randint(1, users)}")).status_code
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors[0] += 1
+
+    async def main():
+        async with app.test_app() as test_app:
+            deadline    = time.perf_counter() + duration
+            start       = time.perf_counter()
+            await asyncio.gather(*(worker(test_app.test_client(), n, deadline) for n in range(concurrency)))
+            return time.perf_counter() - start
+
+    elapsed = asyncio.run(main())
+
+    return summarize('async', concurrency, latencies, errors[0], elapsed)
+
+RUNNERS = {
+    'sync'  : run_sync,
+    'async' : run_async
+}
+
+def run_isolated(mode, *args):
+    # a fresh interpreter per run so peak RSS is not inherited from the previous one
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(RUNNERS[mode], args)
+
+def within_budget(results, memory_mb):
+    best = {}
+    for result in results:
+        if result['peak_rss_mb'] > memory_mb:
+            continue
+        if result['mode'] not in best or result['concurrency'] > best[result['mode']]['concurrency']:
+            best[result['mode']] = result
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.concurrency')
+    parser.add_argument('--db-url', default=config.test_config['DB_URL'])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--concurrency', default='8,32,128,512')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--memory-mb', type=float, default=256, help='report the highest concurrency each mode sustains within this RSS')
+    args = parser.parse_args(argv)
+
+    app_config  = dict(config.test_config, DB_URL=args.db_url)
+    results     = [
+        run_isolated(mode, app_config, args.users, int(concurrency), args.duration)
+        for mode in args.modes.split(',')
+        for concurrency in args.concurrency.split(',')
+    ]
+
+    print(json.dumps({
+        'runs'          : results,
+        'memory_mb'     : args.memory_mb,
+        'within_budget' : within_budget(results, args.memory_mb)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
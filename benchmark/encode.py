@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.records      import Tweet
+from view.serializer    import create_serializer, available_serializers
+
+# 'records' is what the timeline endpoints serialize (Tweet objects through the default hook);
+# 'dicts' is the same data pre-converted, i.e. the encoder alone
+PAYLOADS = ('records', 'dicts')
+
+
+def timeline_payload(tweets=1000, followees=50, records=True):
+    timeline = [Tweet(
+        10 ** 6 - n,
+        n % followees + 2,
+        f"오늘 경기 정말 대단했다 #{n} " + 'lorem ipsum dolor sit amet ' * 5
+    ) for n in range(tweets)]
+
+    return {
+        'user_id'       : 1,
+        'timeline'      : timeline if records else [tweet._asdict() for tweet in timeline],
+        'next_cursor'   : 10 ** 6 - tweets
+    }
+
+def flask_encoder_dumps():
+    from view           import CustomJSONEncoder
+
+    return lambda obj: json.dumps(obj, cls=CustomJSONEncoder).encode('utf-8')
+
+def run(sizes, number):
+    encoders = {name : create_serializer(name).dumps for name in available_serializers()}
+    try:
+        encoders['flask'] = flask_encoder_dumps()
+    except ImportError:
+        pass
+
+    report = {}
+    for size in sizes:
+        report[size] = {}
+        for kind in PAYLOADS:
+            payload = timeline_payload(size, records=kind == 'records')
+            report[size][kind] = {}
+            for name, dumps in encoders.items():
+                elapsed = min(timeit.repeat(lambda: dumps(payload), number=number, repeat=3))
+                report[size][kind][name] = {
+                    'encodes_per_sec'   : number / elapsed,
+                    'mb_per_sec'        : len(dumps(payload)) * number / elapsed / 1e6
+                }
+
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.encode')
+    parser.add_argument('--sizes', type=lambda v: [int(n) for n in v.split(',')], default=[20, 100, 1000, 10000])
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(json.dumps(run(args.sizes, args.number), indent=2))
+
+
+if __name__ == '__main__':
+    main()
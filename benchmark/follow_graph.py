@@ -0,0 +1,61 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.follow_graph   import FollowGraph
+
+
+def random_edges(edges, users, seed=0):
+    rng = random.Random(seed)
+    for _ in range(edges):
+        yield rng.randint(1, users), rng.randint(1, users)
+
+def run(edges, users, lookups=100000):
+    gc.collect()
+
+    graph   = FollowGraph()
+    start   = time.perf_counter()
+    loaded  = graph.load(random_edges(edges, users))
+    elapsed = time.perf_counter() - start
+
+    size    = graph.memory_usage()
+
+    rng     = random.Random(1)
+    ids     = [rng.randint(1, users) for _ in range(lookups)]
+    start   = time.perf_counter()
+    for user_id in ids:
+        graph.get_followees(user_id)
+    followee_lookup = (time.perf_counter() - start) / lookups
+
+    start   = time.perf_counter()
+    for user_id in ids:
+        graph.is_following(user_id, user_id + 1)
+    membership_lookup = (time.perf_counter() - start) / lookups
+
+    return {
+        'edges'                 : loaded,
+        'users'                 : users,
+        'load_seconds'          : elapsed,
+        'bytes'                 : size,
+        'bytes_per_edge'        : size / loaded,
+        'get_followees_us'      : followee_lookup * 1e6,
+        'is_following_us'       : membership_lookup * 1e6
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.follow_graph')
+    parser.add_argument('--edges', type=int, default=10 ** 7)
+    parser.add_argument('--users', type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    print(json.dumps(run(args.edges, args.users), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import json
+import math
+import random
+import threading
+import time
+
+from .seed      import PASSWORD
+
+DEFAULT_MIX = {
+    'login'     : 5,
+    'tweet'     : 15,
+    'timeline'  : 70,
+    'follow'    : 10
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(p / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def percentile_ms(sorted_values, p):
+    value = percentile(sorted_values, p)
+    return value * 1000 if value is not None else None
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def post(self, path, payload, token=None):
+        headers = {'Authorization' : token} if token else {}
+        resp    = self.client.post(path, data=json.dumps(payload), content_type='application/json', headers=headers)
+        return resp.status_code, resp.get_json(silent=True)
+
+    def get(self, path, token=None):
+        headers = {'Authorization' : token} if token else {}
+        resp    = self.client.get(path, headers=headers)
+        return resp.status_code, None
+
+
+class HTTPDriver:
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url   = base_url.rstrip('/')
+        self.session    = requests.Session()
+
+    def post(self, path, payload, token=None):
+        headers = {'Authorization' : token} if token else {}
+        resp    = self.session.post(self.base_url + path, json=payload, headers=headers)
+        try:
+            return resp.status_code, resp.json()
+        except ValueError:
+            return resp.status_code, None
+
+    def get(self, path, token=None):
+        headers = {'Authorization' : token} if token else {}
+        resp    = self.session.get(self.base_url + path, headers=headers)
+        return resp.status_code, None
+
+
+class FollowTargets:
+    # shared by all workers so a follow is never sent for a pair that already exists or is in flight
+    def __init__(self, follows=None, attempts=20):
+        self.follows    = {user_id : set(followees) for user_id, followees in (follows or {}).items()}
+        self.attempts   = attempts
+        self.lock       = threading.Lock()
+
+    def pick(self, rng, users, user_id):
+        with self.lock:
+            followees = self.follows.setdefault(user_id, set())
+            for _ in range(self.attempts):
+                target = rng.choice(users)
+                if target != user_id and target not in followees:
+                    followees.add(target)
+                    return target
+
+        return None
+
+
+class Worker(threading.Thread):
+    def __init__(self, driver, users, mix, deadline, seed, follow_targets=None):
+        super().__init__(daemon=True)
+        self.driver     = driver
+        self.users      = users
+        self.targets    = follow_targets or FollowTargets()
+        self.endpoints  = list(mix)
+        self.weights    = [mix[endpoint] for endpoint in self.endpoints]
+        self.deadline   = deadline
+        self.rng        = random.Random(seed)
+        self.tokens     = {}
+        self.latencies  = {endpoint : [] for endpoint in self.endpoints}
+        self.errors     = {endpoint : 0 for endpoint in self.endpoints}
+        self.skipped    = {endpoint : 0 for endpoint in self.endpoints}
+
+    def login(self, user_id):
+        status, body = self.driver.post('/login', {
+            'email'     : f"user{user_id}@bench",
+            'password'  : PASSWORD
+        })
+        if status == 200 and body:
+            self.tokens[user_id] = body['access_token']
+        return status
+
+    def token(self, user_id):
+        if user_id not in self.tokens:
+            self.login(user_id)
+        return self.tokens.get(user_id)
+
+    def request(self, endpoint, user_id, follow_id=None):
+        if endpoint == 'login':
+            return self.login(user_id)
+        if endpoint == 'tweet':
+            return self.driver.post('/tweet', {'tweet' : 'benchmark tweet'}, self.token(user_id))[0]
+        if endpoint == 'timeline':
+            return self.driver.get('/timeline', self.token(user_id))[0]
+        if endpoint == 'follow':
+            return self.driver.post('/follow', {'follow' : follow_id}, self.token(user_id))[0]
+
+    def run(self):
+        while time.perf_counter() < self.deadline:
+            endpoint    = self.rng.choices(self.endpoints, self.weights)[0]
+            user_id     = self.rng.choice(self.users)
+            follow_id   = None
+
+            if endpoint == 'follow':
+                # users that already follow every sampled target are skipped, not sent as duplicates
+                follow_id = self.targets.pick(self.rng, self.users, user_id)
+                if follow_id is None:
+                    self.skipped[endpoint] += 1
+                    continue
+
+            if endpoint != 'login':
+                self.token(user_id)
+
+            start = time.perf_counter()
+            try:
+                status = self.request(endpoint, user_id, follow_id)
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - start
+
+            self.latencies[endpoint].append(elapsed)
+            if status is None or status >= 400:
+                self.errors[endpoint] += 1
+
+
+def run_workload(make_driver, users, concurrency=8, duration=10.0, mix=None, seed=0, follows=None):
+    mix         = mix or DEFAULT_MIX
+    user_ids    = list(range(1, users + 1))
+    deadline    = time.perf_counter() + duration
+    targets     = FollowTargets(follows)
+    workers     = [
+        Worker(make_driver(), user_ids, mix, deadline, seed + n, targets)
+        for n in range(concurrency)
+    ]
+
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'concurrency'   : concurrency,
+        'duration'      : elapsed,
+        'endpoints'     : {}
+    }
+    for endpoint in mix:
+        latencies   = sorted(l for worker in workers for l in worker.latencies[endpoint])
+        errors      = sum(worker.errors[endpoint] for worker in workers)
+        skipped     = sum(worker.skipped[endpoint] for worker in workers)
+
+        report['endpoints'][endpoint] = {
+            'requests'  : len(latencies),
+            'errors'    : errors,
+            'skipped'   : skipped,
+            'rps'       : len(latencies) / elapsed,
+            'p50_ms'    : percentile_ms(latencies, 50),
+            'p95_ms'    : percentile_ms(latencies, 95),
+            'p99_ms'    : percentile_ms(latencies, 99)
+        }
+
+    return report
@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.records  import Tweet
+
+
+def fake_rows(count):
+    return [(10 ** 6 - n, n % 50 + 2, f"tweet number {n}") for n in range(count)]
+
+def as_dicts(rows):
+    return [{
+        'id'        : row[0],
+        'user_id'   : row[1],
+        'tweet'     : row[2]
+    } for row in rows]
+
+def as_records(rows):
+    return [Tweet(*row) for row in rows]
+
+def measure(build, rows):
+    tracemalloc.start()
+    start           = time.perf_counter()
+    result          = build(rows)
+    elapsed         = time.perf_counter() - start
+    current, peak   = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'seconds'           : elapsed,
+        'bytes'             : current,
+        'peak_bytes'        : peak,
+        'bytes_per_row'     : current / len(result)
+    }
+
+def run(count):
+    rows = fake_rows(count)
+
+    return {
+        'rows'      : count,
+        'dict'      : measure(as_dicts, rows),
+        'record'    : measure(as_records, rows)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.records')
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    print(json.dumps(run(args.rows), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import random
+import bcrypt
+
+from sqlalchemy     import text
+
+PASSWORD = 'pw'
+
+
+def zipf_weights(n, exponent):
+    return [1.0 / (rank ** exponent) for rank in range(1, n + 1)]
+
+def reset_tables(database):
+    database.execute(text("set foreign_key_checks=0"))
+    for table in ('users', 'users_follow_list', 'tweets', 'users_timeline'):
+        database.execute(text(f"truncate {table}"))
+    database.execute(text("set foreign_key_checks=1"))
+
+def seed_social_graph(
+    database,
+    users           = 1000,
+    mean_follows    = 50,
+    follow_skew     = 1.1,
+    mean_tweets     = 20,
+    chunk_size      = 1000,
+    seed            = 0
+):
+    rng             = random.Random(seed)
+    hashed_password = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(4))
+    user_ids        = list(range(1, users + 1))
+
+    insert_users = text("""
+        insert into users (
+            id,
+            name,
+            email,
+            profile,
+            hashed_password
+        ) values (
+            :id,
+            :name,
+            :email,
+            :profile,
+            :hashed_password
+        )
+    """)
+    rows = [{
+        'id'                : user_id,
+        'name'              : f"user{user_id}",
+        'email'             : f"user{user_id}@bench",
+        'profile'           : 'benchmark',
+        'hashed_password'   : hashed_password
+    } for user_id in user_ids]
+    for start in range(0, len(rows), chunk_size):
+        database.execute(insert_users, rows[start:start + chunk_size])
+
+    # followees are drawn from a zipf distribution so a few accounts get most followers
+    weights         = zipf_weights(users, follow_skew)
+    insert_follows  = text("""
+        insert ignore into users_follow_list (
+            user_id,
+            follow_user_id
+        ) values (
+            :user_id,
+            :follow_user_id
+        )
+    """)
+    follows = 0
+    rows    = []
+    for user_id in user_ids:
+        count       = min(users - 1, int(rng.expovariate(1.0 / mean_follows)))
+        followees   = set(rng.choices(user_ids, weights, k=count)) - {user_id}
+        rows.extend({'user_id' : user_id, 'follow_user_id' : followee} for followee in followees)
+
+        if len(rows) >= chunk_size:
+            database.execute(insert_follows, rows)
+            follows += len(rows)
+            rows     = []
+    if rows:
+        database.execute(insert_follows, rows)
+        follows += len(rows)
+
+    insert_tweets = text("""
+        insert into tweets (
+            user_id,
+            tweet
+        ) values (
+            :user_id,
+            :tweet
+        )
+    """)
+    tweets  = 0
+    rows    = []
+    for user_id in user_ids:
+        count = int(rng.expovariate(1.0 / mean_tweets))
+        rows.extend({'user_id' : user_id, 'tweet' : f"tweet {n} from user{user_id}"} for n in range(count))
+
+        if len(rows) >= chunk_size:
+            database.execute(insert_tweets, rows)
+            tweets  += len(rows)
+            rows     = []
+    if rows:
+        database.execute(insert_tweets, rows)
+        tweets += len(rows)
+
+    return {
+        'users'     : users,
+        'follows'   : follows,
+        'tweets'    : tweets
+    }
+
+def load_follows(database):
+    follows = {}
+    for user_id, follow_user_id in database.execute(text("""
+        select
+            user_id,
+            follow_user_id
+        from users_follow_list
+    """)):
+        follows.setdefault(user_id, set()).add(follow_user_id)
+
+    return follows
@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('boto3', 'botocore', 'bcrypt', 'jwt')
+
+# run in a fresh interpreter each time so nothing is already in sys.modules
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import config
+from app import create_app
+imported = time.perf_counter()
+create_app(dict(config.test_config, DB_POOL_WARM_UP=False, FOLLOW_GRAPH=False))
+created = time.perf_counter()
+print(json.dumps({
+    'import_seconds'        : imported - start,
+    'create_app_seconds'    : created - imported,
+    'total_seconds'         : created - start,
+    'loaded'                : [name for name in %r if name in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+
+def probe():
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd                 = ROOT,
+        check               = True,
+        stdout              = subprocess.PIPE,
+        universal_newlines  = True
+    ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+def run(repeat):
+    samples = [probe() for _ in range(repeat)]
+    report  = {
+        key : {
+            'median'    : statistics.median(sample[key] for sample in samples),
+            'min'       : min(sample[key] for sample in samples)
+        } for key in ('import_seconds', 'create_app_seconds', 'total_seconds')
+    }
+    report['repeat'] = repeat
+    report['loaded'] = samples[-1]['loaded']
+
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.startup')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    print(json.dumps(run(args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
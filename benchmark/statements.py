@@ -0,0 +1,73 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+from sqlalchemy                 import create_engine, text
+from sqlalchemy.dialects.mysql  import mysqlconnector
+from model                      import TweetDao
+from model.statements           import TIMELINE, create_compiled_cache
+
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+def compile_overhead(calls):
+    # SQLAlchemy-side cost only: what each execute paid before vs. after the registry
+    dialect = mysqlconnector.dialect()
+    cache   = create_compiled_cache()
+    params  = ['user_id', 'before', 'limit']
+
+    def inline():
+        text(TIMELINE.text).compile(dialect=dialect, column_keys=params)
+
+    def cached():
+        key = (dialect, TIMELINE, tuple(params), False)
+        if key not in cache:
+            cache[key] = TIMELINE.compile(dialect=dialect, column_keys=params)
+        return cache[key]
+
+    return {
+        'inline_text_us'        : per_call_us(inline, calls),
+        'registry_cached_us'    : per_call_us(cached, calls)
+    }
+
+def dao_overhead(db_url, calls, user_id):
+    plain   = create_engine(db_url, encoding='utf-8')
+    cached  = plain.execution_options(compiled_cache=create_compiled_cache())
+    report  = {}
+
+    for name, database in (('plain', plain), ('compiled_cache', cached)):
+        tweet_dao = TweetDao(database)
+        report[name] = {
+            'get_timeline_us'   : per_call_us(lambda: tweet_dao.get_timeline(user_id), calls),
+            'insert_tweet_us'   : per_call_us(lambda: tweet_dao.insert_tweet(user_id, 'benchmark tweet'), calls)
+        }
+
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.statements')
+    parser.add_argument('--db-url', default=config.test_config['DB_URL'])
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--no-db', action='store_true', help='only measure statement compilation')
+    args = parser.parse_args(argv)
+
+    report = {'compile' : compile_overhead(args.calls)}
+    if not args.no_db:
+        report['dao'] = dao_overhead(args.db_url, args.calls, args.user_id)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
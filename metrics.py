@@ -0,0 +1,213 @@
+import bisect
+import functools
+import inspect
+import logging
+import threading
+import time
+
+DEFAULT_BUCKETS = (.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+slow_query_logger = logging.getLogger('slow_query')
+
+
+class Counter:
+    def __init__(self):
+        self.value  = 0
+        self.lock   = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets    = tuple(sorted(buckets))
+        self.counts     = [0] * (len(self.buckets) + 1)
+        self.sum        = 0.0
+        self.count      = 0
+        self.lock       = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self.lock:
+            self.counts[index]  += 1
+            self.sum            += value
+            self.count          += 1
+
+    def snapshot(self):
+        with self.lock:
+            counts  = list(self.counts)
+            total   = self.sum
+            count   = self.count
+
+        cumulative  = 0
+        buckets     = []
+        for le, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            buckets.append(('+Inf' if le == float('inf') else le, cumulative))
+
+        return {
+            'buckets'   : buckets,
+            'sum'       : total,
+            'count'     : count
+        }
+
+    def samples(self, name, labels):
+        snapshot    = self.snapshot()
+        samples     = [
+            (f"{name}_bucket", labels + (('le', str(le)),), count)
+            for le, count in snapshot['buckets']
+        ]
+        samples.append((f"{name}_sum", labels, snapshot['sum']))
+        samples.append((f"{name}_count", labels, snapshot['count']))
+
+        return samples
+
+
+class MetricFamily:
+    def __init__(self, name, documentation, kind, labelnames, factory):
+        self.name           = name
+        self.documentation  = documentation
+        self.kind           = kind
+        self.labelnames     = tuple(labelnames)
+        self.factory        = factory
+        self.children       = {}
+        self.lock           = threading.Lock()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.factory())
+        return child
+
+    def collect(self):
+        samples = []
+        for values, child in list(self.children.items()):
+            samples.extend(child.samples(self.name, tuple(zip(self.labelnames, values))))
+        return self.name, self.kind, self.documentation, samples
+
+
+class Registry:
+    def __init__(self):
+        self.families   = {}
+        self.collectors = []
+
+    def family(self, name, documentation, kind, labelnames, factory):
+        if name not in self.families:
+            self.families[name] = MetricFamily(name, documentation, kind, labelnames, factory)
+        return self.families[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.family(name, documentation, 'counter', labelnames, Counter)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.family(name, documentation, 'histogram', labelnames, lambda: Histogram(buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def collect(self):
+        for family in self.families.values():
+            yield family.collect()
+        for collector in self.collectors:
+            yield from collector()
+
+    def exposition(self):
+        lines = []
+        for name, kind, documentation, samples in self.collect():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                if labels:
+                    label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                    lines.append(f"{sample_name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{sample_name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def stats_collector(prefix, documentation, stats):
+    def collect():
+        for key, value in stats().items():
+            if isinstance(value, (int, float)):
+                name = f"{prefix}_{key}"
+                yield name, 'gauge', f"{documentation} {key}", [(name, (), value)]
+    return collect
+
+# DAO readers are named get_* / iter_*; everything else is a write whose rowcount or lastrowid is not rows read
+READ_PREFIXES = ('get_', 'iter_')
+
+def result_rows(result, keyed=False):
+    # a record (dict, namedtuple) or scalar is one row; lists, and dicts keyed by id, hold one row per entry
+    if result is None:
+        return 0
+    if keyed or isinstance(result, (list, set)):
+        return len(result)
+    return 1
+
+def instrument_dao(dao, registry, slow_query_seconds=None):
+    latency = registry.histogram('dao_query_seconds', 'DAO method latency', ('dao', 'method'))
+    rows    = registry.counter('dao_rows_total', 'Rows returned by DAO methods', ('dao', 'method'))
+    errors  = registry.counter('dao_errors_total', 'DAO method errors', ('dao', 'method'))
+    dao_name    = type(dao).__name__
+    keyed_reads = getattr(dao, 'keyed_reads', ())
+
+    def wrap(name, method):
+        method_latency  = latency.labels(dao_name, name)
+        method_rows     = rows.labels(dao_name, name)
+        method_errors   = errors.labels(dao_name, name)
+        is_read         = name.startswith(READ_PREFIXES)
+        keyed           = name in keyed_reads
+
+        def observe(start):
+            elapsed = time.perf_counter() - start
+            method_latency.observe(elapsed)
+            if slow_query_seconds is not None and elapsed >= slow_query_seconds:
+                slow_query_logger.warning('%s.%s took %.3fs', dao_name, name, elapsed)
+
+        @functools.wraps(method)
+        def instrumented(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                method_errors.inc()
+                raise
+            finally:
+                observe(start)
+
+            if is_read:
+                method_rows.inc(result_rows(result, keyed))
+            return result
+
+        # streaming readers do their work while being iterated, not when called
+        @functools.wraps(method)
+        def instrumented_generator(*args, **kwargs):
+            start   = time.perf_counter()
+            count   = 0
+            try:
+                for item in method(*args, **kwargs):
+                    count += 1
+                    yield item
+            except Exception:
+                method_errors.inc()
+                raise
+            finally:
+                observe(start)
+                method_rows.inc(count)
+
+        return instrumented_generator if inspect.isgeneratorfunction(method) else instrumented
+
+    for name in dir(dao):
+        method = getattr(dao, name)
+        if not name.startswith('_') and callable(method):
+            setattr(dao, name, wrap(name, method))
+
+    return dao
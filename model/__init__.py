@@ -1,7 +1,17 @@
 from .user_dao      import UserDao
 from .tweet_dao     import TweetDao
+from .timeline_dao  import TimelineDao
+from .pool          import InstrumentedQueuePool, warm_up_pool
+from .records       import Tweet, UserCredential
+from .engine_router import EngineRouter
 
 __all__ = [
     'UserDao',
-    'TweetDao'
+    'TweetDao',
+    'TimelineDao',
+    'InstrumentedQueuePool',
+    'warm_up_pool',
+    'Tweet',
+    'UserCredential',
+    'EngineRouter'
 ]
@@ -0,0 +1,284 @@
+import aiomysql
+
+from contextlib                 import asynccontextmanager
+from sqlalchemy                 import text
+from sqlalchemy.engine.url      import make_url
+from sqlalchemy.dialects.mysql  import pymysql
+from .records                   import Tweet, UserCredential
+from .tweet_dao                 import MAX_TWEET_ID
+from .                          import statements
+
+DIALECT = pymysql.dialect()
+
+
+def compile_statement(statement):
+    # pymysql-style %(name)s placeholders; lists bound to "in :ids" are escaped as (1, 2, ...)
+    return str(text(statement.text).compile(dialect=DIALECT))
+
+
+async def create_async_pool(db_url, config):
+    url = make_url(db_url)
+
+    return await aiomysql.create_pool(
+        host            = url.host,
+        port            = url.port or 3306,
+        user            = url.username,
+        password        = url.password or '',
+        db              = url.database,
+        charset         = 'utf8mb4',
+        autocommit      = True,
+        minsize         = config.get('DB_POOL_MIN_SIZE', 1),
+        maxsize         = config.get('DB_POOL_SIZE', 5),
+        pool_recycle    = config.get('DB_POOL_RECYCLE', -1)
+    )
+
+
+INSERT_USER             = compile_statement(statements.INSERT_USER)
+USER_CREDENTIAL         = compile_statement(statements.USER_CREDENTIAL)
+EXISTING_USER_IDS       = compile_statement(statements.EXISTING_USER_IDS)
+INSERT_FOLLOW           = compile_statement(statements.INSERT_FOLLOW)
+INSERT_FOLLOW_IGNORE    = compile_statement(statements.INSERT_FOLLOW_IGNORE)
+DELETE_FOLLOW           = compile_statement(statements.DELETE_FOLLOW)
+DELETE_FOLLOWS          = compile_statement(statements.DELETE_FOLLOWS)
+FOLLOWING_IDS           = compile_statement(statements.FOLLOWING_IDS)
+FOLLOWING_IDS_FOR_UPDATE = compile_statement(statements.FOLLOWING_IDS_FOR_UPDATE)
+FOLLOWER_IDS            = compile_statement(statements.FOLLOWER_IDS)
+PROFILE_PICTURE         = compile_statement(statements.PROFILE_PICTURE)
+PROFILE_PICTURES        = compile_statement(statements.PROFILE_PICTURES)
+SAVE_PROFILE_PICTURE    = compile_statement(statements.SAVE_PROFILE_PICTURE)
+SWAP_PROFILE_PICTURE    = compile_statement(statements.SWAP_PROFILE_PICTURE)
+INSERT_PICTURE_UPLOAD   = compile_statement(statements.INSERT_PICTURE_UPLOAD)
+COMPLETE_PICTURE_UPLOAD = compile_statement(statements.COMPLETE_PICTURE_UPLOAD)
+FAIL_PICTURE_UPLOAD     = compile_statement(statements.FAIL_PICTURE_UPLOAD)
+PICTURE_UPLOAD          = compile_statement(statements.PICTURE_UPLOAD)
+INSERT_TWEET            = compile_statement(statements.INSERT_TWEET)
+TIMELINE                = compile_statement(statements.TIMELINE)
+USERS_TIMELINE          = compile_statement(statements.USERS_TIMELINE)
+TIMELINE_VERSION        = compile_statement(statements.TIMELINE_VERSION)
+
+
+class AsyncDao:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def execute(self, statement, params=None):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(statement, params)
+                return cursor
+
+    async def fetchone(self, statement, params=None):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(statement, params)
+                return await cursor.fetchone()
+
+    async def fetchall(self, statement, params=None):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(statement, params)
+                return await cursor.fetchall()
+
+    @asynccontextmanager
+    async def begin(self):
+        # the pool runs in autocommit; this holds one connection in an explicit transaction
+        async with self.pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    yield cursor
+            except BaseException:
+                await conn.rollback()
+                raise
+            await conn.commit()
+
+
+class AsyncUserDao(AsyncDao):
+    async def insert_user(self, user):
+        cursor = await self.execute(INSERT_USER, user)
+        return cursor.lastrowid
+
+    async def get_user_id_and_password(self, email):
+        row = await self.fetchone(USER_CREDENTIAL, {'email' : email})
+
+        return UserCredential(*row) if row else None
+
+    async def insert_follow(self, user_id, follow_id):
+        cursor = await self.execute(INSERT_FOLLOW, {
+            'id'        : user_id,
+            'follow'    : follow_id
+        })
+        return cursor.rowcount
+
+    async def insert_unfollow(self, user_id, unfollow_id):
+        cursor = await self.execute(DELETE_FOLLOW, {
+            'id'        : user_id,
+            'unfollow'  : unfollow_id
+        })
+        return cursor.rowcount
+
+    async def get_follower_ids(self, user_id):
+        rows = await self.fetchall(FOLLOWER_IDS, {'user_id' : user_id})
+
+        return [row[0] for row in rows]
+
+    async def insert_follows(self, user_id, follow_ids):
+        follow_ids = list(dict.fromkeys(follow_ids))
+        if not follow_ids:
+            return {}
+
+        async with self.begin() as cursor:
+            await cursor.execute(EXISTING_USER_IDS, {'ids' : follow_ids})
+            users = {row[0] for row in await cursor.fetchall()}
+
+            await cursor.execute(FOLLOWING_IDS, {
+                'id'    : user_id,
+                'ids'   : follow_ids
+            })
+            following = {row[0] for row in await cursor.fetchall()}
+
+            new_ids = [
+                follow_id for follow_id in follow_ids
+                if follow_id != user_id and follow_id in users and follow_id not in following
+            ]
+            if new_ids:
+                await cursor.executemany(INSERT_FOLLOW_IGNORE, [{
+                    'id'        : user_id,
+                    'follow'    : follow_id
+                } for follow_id in new_ids])
+
+        return {
+            follow_id : (
+                'self'                  if follow_id == user_id else
+                'not_found'             if follow_id not in users else
+                'already_following'     if follow_id in following else
+                'followed'
+            ) for follow_id in follow_ids
+        }
+
+    async def insert_unfollows(self, user_id, unfollow_ids):
+        unfollow_ids = list(dict.fromkeys(unfollow_ids))
+        if not unfollow_ids:
+            return {}
+
+        async with self.begin() as cursor:
+            await cursor.execute(FOLLOWING_IDS_FOR_UPDATE, {
+                'id'    : user_id,
+                'ids'   : unfollow_ids
+            })
+            following = {row[0] for row in await cursor.fetchall()}
+
+            if following:
+                await cursor.execute(DELETE_FOLLOWS, {
+                    'id'    : user_id,
+                    'ids'   : list(following)
+                })
+
+        return {
+            unfollow_id : 'unfollowed' if unfollow_id in following else 'not_following'
+            for unfollow_id in unfollow_ids
+        }
+
+    async def save_profile_picture(self, profile_pic_path, user_id):
+        cursor = await self.execute(SAVE_PROFILE_PICTURE, {
+            'user_id'           : user_id,
+            'profile_pic_path'  : profile_pic_path
+        })
+        return cursor.rowcount
+
+    async def insert_profile_picture_upload(self, user_id, filename):
+        cursor = await self.execute(INSERT_PICTURE_UPLOAD, {
+            'user_id'   : user_id,
+            'filename'  : filename
+        })
+        return cursor.lastrowid
+
+    async def complete_profile_picture_upload(self, upload_id, user_id, profile_pic_path):
+        async with self.begin() as cursor:
+            await cursor.execute(COMPLETE_PICTURE_UPLOAD, {
+                'upload_id'         : upload_id,
+                'profile_pic_path'  : profile_pic_path
+            })
+            await cursor.execute(SWAP_PROFILE_PICTURE, {
+                'user_id'           : user_id,
+                'upload_id'         : upload_id,
+                'profile_pic_path'  : profile_pic_path
+            })
+            return cursor.rowcount
+
+    async def fail_profile_picture_upload(self, upload_id):
+        cursor = await self.execute(FAIL_PICTURE_UPLOAD, {'upload_id' : upload_id})
+        return cursor.rowcount
+
+    async def get_profile_picture_upload(self, upload_id):
+        row = await self.fetchone(PICTURE_UPLOAD, {'upload_id' : upload_id})
+
+        return {
+            'id'        : row[0],
+            'user_id'   : row[1],
+            'status'    : row[2],
+            'url'       : row[3]
+        } if row else None
+
+    async def get_profile_picture(self, user_id):
+        row = await self.fetchone(PROFILE_PICTURE, {'user_id' : user_id})
+
+        return row[0] if row else None
+
+    async def get_profile_pictures(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+
+        rows = await self.fetchall(PROFILE_PICTURES, {'user_ids' : user_ids})
+
+        return {row[0] : row[1] for row in rows}
+
+
+class AsyncTweetDao(AsyncDao):
+    async def insert_tweet(self, user_id, tweet):
+        cursor = await self.execute(INSERT_TWEET, {
+            'id'    : user_id,
+            'tweet' : tweet
+        })
+        return cursor.lastrowid
+
+    async def insert_tweets(self, user_id, tweets, chunk_size=1000):
+        rowcount = 0
+        async with self.begin() as cursor:
+            for start in range(0, len(tweets), chunk_size):
+                await cursor.executemany(INSERT_TWEET, [{
+                    'id'    : user_id,
+                    'tweet' : tweet
+                } for tweet in tweets[start:start + chunk_size]])
+                rowcount += cursor.rowcount
+
+        return rowcount
+
+    async def get_timeline(self, user_id, before=None, limit=20):
+        rows = await self.fetchall(TIMELINE, {
+            'user_id'   : user_id,
+            'before'    : before or MAX_TWEET_ID,
+            'limit'     : limit
+        })
+
+        return [Tweet(*row) for row in rows]
+
+    async def get_users_timeline(self, user_id, followee_ids, before=None, limit=20):
+        rows = await self.fetchall(USERS_TIMELINE, {
+            'user_ids'  : [user_id, *followee_ids],
+            'before'    : before or MAX_TWEET_ID,
+            'limit'     : limit
+        })
+
+        return [Tweet(*row) for row in rows]
+
+    async def get_timeline_version(self, user_id):
+        latest_id, follows, follow_hash, latest_at = await self.fetchone(TIMELINE_VERSION, {'user_id' : user_id})
+
+        return {
+            'latest_id'     : latest_id,
+            'follows'       : follows,
+            'follow_hash'   : follow_hash,
+            'latest_at'     : latest_at
+        }
@@ -0,0 +1,54 @@
+import itertools
+import threading
+import time
+
+
+class EngineRouter:
+    def __init__(self, primary, replicas=(), strategy='round_robin', read_your_writes=5):
+        self.primary            = primary
+        self.replicas           = list(replicas)
+        self.strategy           = strategy
+        self.read_your_writes   = read_your_writes
+        self.recent_writes      = {}
+        self.counter            = itertools.count()
+        self.lock               = threading.Lock()
+
+    @classmethod
+    def wrap(cls, database):
+        return database if isinstance(database, cls) else cls(database)
+
+    def execute(self, *args, **kwargs):
+        return self.primary.execute(*args, **kwargs)
+
+    def begin(self):
+        return self.primary.begin()
+
+    def connect(self):
+        return self.primary.connect()
+
+    def mark_write(self, user_id):
+        if not self.replicas or not self.read_your_writes or user_id is None:
+            return
+
+        now = time.monotonic()
+        with self.lock:
+            self.recent_writes[user_id] = now + self.read_your_writes
+
+            if len(self.recent_writes) > 10000:
+                self.recent_writes = {
+                    key : deadline for key, deadline in self.recent_writes.items() if deadline > now
+                }
+
+    def wrote_recently(self, user_id):
+        deadline = self.recent_writes.get(user_id)
+        return deadline is not None and deadline > time.monotonic()
+
+    def reader(self, user_id=None):
+        if not self.replicas:
+            return self.primary
+        if user_id is not None and self.wrote_recently(user_id):
+            return self.primary
+
+        if self.strategy == 'least_busy':
+            return min(self.replicas, key=lambda replica: replica.pool.checkedout())
+        return self.replicas[next(self.counter) % len(self.replicas)]
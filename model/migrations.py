@@ -0,0 +1,172 @@
+from sqlalchemy     import text
+
+SCHEMA_MIGRATIONS = text("""
+    create table if not exists schema_migrations (
+        version     int not null,
+        name        varchar(255) not null,
+        applied_at  timestamp not null default current_timestamp,
+        primary key (version)
+    )
+""")
+
+def create_tables(conn):
+    conn.execute(text("""
+        create table if not exists users (
+            id              int not null auto_increment,
+            name            varchar(255) not null,
+            email           varchar(255) not null,
+            hashed_password varchar(255) not null,
+            profile         varchar(2000) not null,
+            profile_picture varchar(255) null,
+            created_at      timestamp not null default current_timestamp,
+            updated_at      timestamp null default null on update current_timestamp,
+            primary key (id),
+            unique key email (email)
+        )
+    """))
+
+    conn.execute(text("""
+        create table if not exists tweets (
+            id              bigint not null auto_increment,
+            user_id         int not null,
+            tweet           varchar(300) not null,
+            created_at      timestamp not null default current_timestamp,
+            primary key (id),
+            key user_id_id (user_id, id),
+            constraint tweets_user_id_fkey foreign key (user_id) references users(id)
+        )
+    """))
+
+    conn.execute(text("""
+        create table if not exists users_follow_list (
+            user_id         int not null,
+            follow_user_id  int not null,
+            created_at      timestamp not null default current_timestamp,
+            primary key (user_id, follow_user_id),
+            key follow_user_id_user_id (follow_user_id, user_id),
+            constraint users_follow_list_user_id_fkey foreign key (user_id) references users(id),
+            constraint users_follow_list_follow_user_id_fkey foreign key (follow_user_id) references users(id)
+        )
+    """))
+
+    conn.execute(text("""
+        create table if not exists users_timeline (
+            user_id         int not null,
+            tweet_id        bigint not null,
+            primary key (user_id, tweet_id),
+            constraint users_timeline_user_id_fkey foreign key (user_id) references users(id),
+            constraint users_timeline_tweet_id_fkey foreign key (tweet_id) references tweets(id)
+        )
+    """))
+
+    conn.execute(text("""
+        create table if not exists profile_picture_uploads (
+            id              int not null auto_increment,
+            user_id         int not null,
+            filename        varchar(255) not null,
+            status          varchar(16) not null,
+            url             varchar(255) null,
+            created_at      timestamp not null default current_timestamp,
+            updated_at      timestamp null default null on update current_timestamp,
+            primary key (id),
+            key user_id_status_id (user_id, status, id),
+            constraint profile_picture_uploads_user_id_fkey foreign key (user_id) references users(id)
+        )
+    """))
+
+def index_exists(conn, table, columns, unique=False):
+    # matched by columns, not name: an older schema may carry the same key under another name or as the primary key
+    rows = conn.execute(text("""
+        select
+            index_name,
+            non_unique,
+            column_name
+        from information_schema.statistics
+        where table_schema = database()
+            and table_name = :table
+        order by index_name, seq_in_index
+    """), {'table' : table}).fetchall()
+
+    indexes = {}
+    for index_name, non_unique, column_name in rows:
+        indexes.setdefault(index_name, (not non_unique, []))[1].append(column_name.lower())
+
+    # a prefix serves lookups, but only an exact unique key enforces uniqueness on these columns
+    return any(
+        (is_unique and index_columns == columns) if unique else index_columns[:len(columns)] == columns
+        for is_unique, index_columns in indexes.values()
+    )
+
+def ensure_index(conn, table, index, columns, unique=False):
+    if not index_exists(conn, table, columns, unique):
+        conn.execute(text(f"create {'unique ' if unique else ''}index {index} on {table} ({', '.join(columns)})"))
+
+def add_hot_path_indexes(conn):
+    # tables created before this module existed may lack the indexes the DAO queries rely on
+    ensure_index(conn, 'users', 'email', ['email'], unique=True)
+    ensure_index(conn, 'tweets', 'user_id_id', ['user_id', 'id'])
+    ensure_index(conn, 'users_follow_list', 'user_id_follow_user_id', ['user_id', 'follow_user_id'], unique=True)
+    ensure_index(conn, 'users_follow_list', 'follow_user_id_user_id', ['follow_user_id', 'user_id'])
+    ensure_index(conn, 'profile_picture_uploads', 'user_id_status_id', ['user_id', 'status', 'id'])
+
+MIGRATIONS = [
+    (1, 'create tables', create_tables),
+    (2, 'add hot path indexes', add_hot_path_indexes)
+]
+
+
+def applied_versions(database):
+    database.execute(SCHEMA_MIGRATIONS)
+    return {row[0] for row in database.execute(text("select version from schema_migrations"))}
+
+def migrate(database, target=None):
+    applied = applied_versions(database)
+    pending = [
+        (version, name, apply) for version, name, apply in MIGRATIONS
+        if version not in applied and (target is None or version <= target)
+    ]
+
+    for version, name, apply in pending:
+        # MySQL commits DDL implicitly, so each step is recorded right after it runs
+        with database.begin() as conn:
+            apply(conn)
+            conn.execute(text("""
+                insert into schema_migrations (
+                    version,
+                    name
+                ) values (
+                    :version,
+                    :name
+                )
+            """), {'version' : version, 'name' : name})
+
+    return [version for version, _, _ in pending]
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import config
+
+    from sqlalchemy     import create_engine
+    from .plan_check    import full_scans
+
+    parser = argparse.ArgumentParser(prog='python -m model.migrations')
+    parser.add_argument('--db-url', default=config.DB_URL)
+    parser.add_argument('--target', type=int)
+    parser.add_argument('--check-plans', action='store_true', help='EXPLAIN every DAO statement and fail on full table scans')
+    args = parser.parse_args(argv)
+
+    database    = create_engine(args.db_url, encoding='utf-8')
+    report      = {'applied' : migrate(database, args.target)}
+
+    if args.check_plans:
+        report['full_scans'] = full_scans(database)
+
+    print(json.dumps(report, indent=2))
+
+    return 1 if report.get('full_scans') else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,62 @@
+from sqlalchemy                 import text
+from sqlalchemy.sql.elements    import TextClause
+from .                          import statements
+from .tweet_dao                 import MAX_TWEET_ID
+
+SAMPLE_PARAMS = {
+    'id'                : 1,
+    'user_id'           : 1,
+    'user_ids'          : [1, 2],
+    'ids'               : [1, 2],
+    'follow'            : 2,
+    'unfollow'          : 2,
+    'follow_id'         : 2,
+    'unfollow_id'       : 2,
+    'tweet_id'          : 1,
+    'since_id'          : 0,
+    'upload_id'         : 1,
+    'before'            : MAX_TWEET_ID,
+    'limit'             : 20,
+    'offset'            : 800,
+    'cutoff'            : 1,
+    'tweet'             : 'explain',
+    'name'              : 'explain',
+    'email'             : 'explain@',
+    'profile'           : 'explain',
+    'password'          : 'explain',
+    'filename'          : 'explain.png',
+    'profile_pic_path'  : 'explain.png'
+}
+
+# reads every edge on purpose (follow graph warm-up)
+FULL_SCAN_ALLOWED = {'FOLLOW_EDGES'}
+
+
+def registered_statements():
+    return {
+        name : value for name, value in vars(statements).items()
+        if isinstance(value, TextClause)
+    }
+
+def explain(database, statement, params=None):
+    compiled    = statement.compile()
+    params      = params or {name : SAMPLE_PARAMS[name] for name in compiled.params}
+    explained   = text('explain ' + statement.text).bindparams(*(
+        compiled.binds[name] for name in compiled.params
+    ))
+
+    return [dict(row) for row in database.execute(explained, params)]
+
+def full_scans(database):
+    scans = []
+    for name, statement in sorted(registered_statements().items()):
+        if name in FULL_SCAN_ALLOWED:
+            continue
+
+        for row in explain(database, statement):
+            table = row['table'] or ''
+            # INSERT rows describe the write target; <derivedN>/<unionN,M> are in-memory results
+            if row['type'] == 'ALL' and row['select_type'] != 'INSERT' and not table.startswith('<'):
+                scans.append((name, table))
+
+    return scans
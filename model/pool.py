@@ -0,0 +1,57 @@
+import threading
+import time
+
+from sqlalchemy.pool    import QueuePool
+from metrics            import Histogram
+
+
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, creator, **kw):
+        super().__init__(creator, **kw)
+        self.waiting            = 0
+        self.checkout_failures  = 0
+        self.wait_time          = Histogram()
+        self.lock               = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+
+        try:
+            return super()._do_get()
+        except Exception:
+            with self.lock:
+                self.checkout_failures += 1
+            raise
+        finally:
+            with self.lock:
+                self.waiting -= 1
+            self.wait_time.observe(time.perf_counter() - start)
+
+    def stats(self):
+        return {
+            'size'              : self.size(),
+            'checked_out'       : self.checkedout(),
+            'overflow'          : self.overflow(),
+            'waiting'           : self.waiting,
+            'checkout_failures' : self.checkout_failures,
+            'wait_time'         : self.wait_time.snapshot()
+        }
+
+    def collect(self):
+        stats = self.stats()
+        for key in ('size', 'checked_out', 'overflow', 'waiting', 'checkout_failures'):
+            name = f"db_pool_{key}"
+            yield name, 'gauge', f"Connection pool {key}", [(name, (), stats[key])]
+
+        name = 'db_pool_checkout_wait_seconds'
+        yield name, 'histogram', 'Connection pool checkout wait time', self.wait_time.samples(name, ())
+
+
+def warm_up_pool(database, connections):
+    conns = [database.connect() for _ in range(connections)]
+    for conn in conns:
+        conn.close()
+
+    return len(conns)
@@ -0,0 +1,45 @@
+class Tweet:
+    __slots__ = ('id', 'user_id', 'tweet')
+
+    def __init__(self, id, user_id, tweet):
+        self.id         = id
+        self.user_id    = user_id
+        self.tweet      = tweet
+
+    def _asdict(self):
+        return {
+            'id'        : self.id,
+            'user_id'   : self.user_id,
+            'tweet'     : self.tweet
+        }
+
+    def __iter__(self):
+        return iter((self.id, self.user_id, self.tweet))
+
+    def __eq__(self, other):
+        if not isinstance(other, Tweet):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return f"Tweet(id={self.id!r}, user_id={self.user_id!r}, tweet={self.tweet!r})"
+
+
+class UserCredential:
+    __slots__ = ('id', 'hashed_password')
+
+    def __init__(self, id, hashed_password):
+        self.id                 = id
+        self.hashed_password    = hashed_password
+
+    def _asdict(self):
+        return {
+            'id'                : self.id,
+            'hashed_password'   : self.hashed_password
+        }
+
+    def __repr__(self):
+        return f"UserCredential(id={self.id!r})"
@@ -0,0 +1,474 @@
+from sqlalchemy         import text, bindparam, Integer, BigInteger, String
+from sqlalchemy.util    import LRUCache
+
+# Statements are built once at import and shared by every DAO call. Reusing the
+# same objects lets an engine with execution_options(compiled_cache=...) skip
+# recompiling them on each execute.
+
+COMPILED_CACHE_SIZE = 500
+
+
+def create_compiled_cache(size=COMPILED_CACHE_SIZE):
+    return LRUCache(size)
+
+def statement(sql, expanding=(), **types):
+    return text(sql).bindparams(*(
+        bindparam(name, type_=type_, expanding=name in expanding)
+        for name, type_ in types.items()
+    ))
+
+##########################
+## tweets
+##########################
+
+INSERT_TWEET = statement("""
+    insert into tweets (
+        user_id,
+        tweet
+    ) values (
+        :id,
+        :tweet
+    )
+""", id=Integer, tweet=String)
+
+LAST_TWEET_ID = statement("""
+    select max(id) as id
+    from tweets
+    where user_id = :user_id
+""", user_id=Integer)
+
+# union, not union all: a user who follows themself would otherwise get their own tweets twice
+TIMELINE = statement("""
+    select
+        id,
+        user_id,
+        tweet
+    from (
+        (
+            select
+                t.id,
+                t.user_id,
+                t.tweet
+            from tweets t
+            where t.user_id = :user_id
+                and t.id < :before
+            order by t.id desc
+            limit :limit
+        )
+        union
+        (
+            select
+                t.id,
+                t.user_id,
+                t.tweet
+            from users_follow_list ufl
+            join tweets t
+                on t.user_id = ufl.follow_user_id
+            where ufl.user_id = :user_id
+                and t.id < :before
+            order by t.id desc
+            limit :limit
+        )
+    ) timeline
+    order by id desc
+    limit :limit
+""", user_id=Integer, before=BigInteger, limit=BigInteger)
+
+USERS_# union, not union all: a user who follows themself would otherwise get their own tweets twice
+TIMELINE = statement("""
+    select
+        id,
+        user_id,
+        tweet
+    from tweets
+    where user_id in :user_ids
+        and id < :before
+    order by id desc
+    limit :limit
+""", expanding=('user_ids',), user_ids=Integer, before=BigInteger, limit=BigInteger)
+
+# newest :limit tweets of the user and of each followee, one (user_id, id) index range each;
+# ordered per author so the runs can be k-way merged (join lateral needs MySQL 8.0.14+)
+FOLLOWEE_TIMELINES = statement("""
+    select
+        t.id,
+        t.user_id,
+        t.tweet
+    from (
+        select :user_id as user_id
+        union all
+        select follow_user_id
+        from users_follow_list
+        where user_id = :user_id
+    ) f
+    join lateral (
+        select
+            id,
+            user_id,
+            tweet
+        from tweets
+        where user_id = f.user_id
+            and id < :before
+        order by id desc
+        limit :limit
+    ) t
+    order by t.user_id, t.id desc
+""", user_id=Integer, before=BigInteger, limit=BigInteger)
+
+TIMELINE_VERSION = statement("""
+    select
+        v.latest_id,
+        v.follows,
+        v.follow_hash,
+        (
+            select created_at
+            from tweets
+            where id = v.latest_id
+        ) as latest_at
+    from (
+        select
+            greatest(
+                coalesce((
+                    select max(id)
+                    from tweets
+                    where user_id = :user_id
+                ), 0),
+                coalesce((
+                    select max((
+                        select max(t.id)
+                        from tweets t
+                        where t.user_id = ufl.follow_user_id
+                    ))
+                    from users_follow_list ufl
+                    where ufl.user_id = :user_id
+                ), 0)
+            ) as latest_id,
+            (
+                select count(*)
+                from users_follow_list
+                where user_id = :user_id
+            ) as follows,
+            (
+                select coalesce(bit_xor(follow_user_id), 0)
+                from users_follow_list
+                where user_id = :user_id
+            ) as follow_hash
+    ) v
+""", user_id=Integer)
+
+##########################
+## users_timeline (fan-out on write)
+##########################
+
+FANOUT_# union, not union all: a user who follows themself would otherwise get their own tweets twice
+TIMELINE = statement("""
+    select
+        t.id,
+        t.user_id,
+        t.tweet
+    from users_timeline ut
+    join tweets t
+        on t.id = ut.tweet_id
+    where ut.user_id = :user_id
+        and ut.tweet_id < :before
+    order by ut.tweet_id desc
+    limit :limit
+""", user_id=Integer, before=BigInteger, limit=BigInteger)
+
+PUSH_TWEET = statement("""
+    insert ignore into users_timeline (
+        user_id,
+        tweet_id
+    )
+    select :user_id, :tweet_id
+    union all
+    select
+        user_id,
+        :tweet_id
+    from users_follow_list
+    where follow_user_id = :user_id
+""", user_id=Integer, tweet_id=BigInteger)
+
+PUSH_TWEETS_SINCE = statement("""
+    insert ignore into users_timeline (
+        user_id,
+        tweet_id
+    )
+    select
+        f.user_id,
+        t.id
+    from tweets t
+    join (
+        select :user_id as user_id
+        union all
+        select user_id
+        from users_follow_list
+        where follow_user_id = :user_id
+    ) f
+    where t.user_id = :user_id
+        and t.id > :since_id
+""", user_id=Integer, since_id=BigInteger)
+
+ADD_FOLLOWEE = statement("""
+    insert ignore into users_timeline (
+        user_id,
+        tweet_id
+    )
+    select
+        :user_id,
+        id
+    from tweets
+    where user_id = :follow_id
+    order by id desc
+    limit :limit
+""", user_id=Integer, follow_id=Integer, limit=BigInteger)
+
+REMOVE_FOLLOWEE = statement("""
+    delete ut
+    from users_timeline ut
+    join tweets t
+        on t.id = ut.tweet_id
+    where ut.user_id = :user_id
+        and t.user_id = :unfollow_id
+""", user_id=Integer, unfollow_id=Integer)
+
+CLEAR_# union, not union all: a user who follows themself would otherwise get their own tweets twice
+TIMELINE = statement("""
+    delete from users_timeline
+    where user_id = :user_id
+""", user_id=Integer)
+
+REBUILD_# union, not union all: a user who follows themself would otherwise get their own tweets twice
+TIMELINE = statement("""
+    insert ignore into users_timeline (
+        user_id,
+        tweet_id
+    )
+    select
+        :user_id,
+        id
+    from (
+        (
+            select t.id
+            from tweets t
+            where t.user_id = :user_id
+            order by t.id desc
+            limit :limit
+        )
+        union all
+        (
+            select t.id
+            from users_follow_list ufl
+            join tweets t
+                on t.user_id = ufl.follow_user_id
+            where ufl.user_id = :user_id
+            order by t.id desc
+            limit :limit
+        )
+    ) newest
+    order by id desc
+    limit :limit
+""", user_id=Integer, limit=BigInteger)
+
+# newest tweet_id past the cap for the author and each follower; older entries get trimmed
+TIMELINE_CUTOFFS = statement("""
+    select
+        r.user_id,
+        (
+            select ut.tweet_id
+            from users_timeline ut
+            where ut.user_id = r.user_id
+            order by ut.tweet_id desc
+            limit 1 offset :offset
+        ) as cutoff
+    from (
+        select :user_id as user_id
+        union all
+        select user_id
+        from users_follow_list
+        where follow_user_id = :user_id
+    ) r
+""", user_id=Integer, offset=BigInteger)
+
+TIMELINE_CUTOFF = statement("""
+    select tweet_id
+    from users_timeline
+    where user_id = :user_id
+    order by tweet_id desc
+    limit 1 offset :offset
+""", user_id=Integer, offset=BigInteger)
+
+TRIM_# union, not union all: a user who follows themself would otherwise get their own tweets twice
+TIMELINE = statement("""
+    delete from users_timeline
+    where user_id = :user_id
+        and tweet_id <= :cutoff
+""", user_id=Integer, cutoff=BigInteger)
+
+##########################
+## users
+##########################
+
+INSERT_USER = statement("""
+    insert into users(
+        name,
+        email,
+        profile,
+        hashed_password
+    ) values (
+        :name,
+        :email,
+        :profile,
+        :password
+    )
+""", name=String, email=String, profile=String, password=String)
+
+USER_CREDENTIAL = statement("""
+    select
+        id,
+        hashed_password
+    from users
+    where email = :email
+""", email=String)
+
+EXISTING_USER_IDS = statement("""
+    select id
+    from users
+    where id in :ids
+""", expanding=('ids',), ids=Integer)
+
+PROFILE_PICTURE = statement("""
+    select profile_picture
+    from users
+    where id = :user_id
+""", user_id=Integer)
+
+PROFILE_PICTURES = statement("""
+    select
+        id,
+        profile_picture
+    from users
+    where id in :user_ids
+""", expanding=('user_ids',), user_ids=Integer)
+
+SAVE_PROFILE_PICTURE = statement("""
+    update users
+    set profile_picture = :profile_pic_path
+    where id = :user_id
+""", user_id=Integer, profile_pic_path=String)
+
+SWAP_PROFILE_PICTURE = statement("""
+    update users
+    set profile_picture = :profile_pic_path
+    where id = :user_id
+        and not exists (
+            select 1
+            from profile_picture_uploads
+            where user_id = :user_id
+                and status = 'done'
+                and id > :upload_id
+        )
+""", user_id=Integer, upload_id=Integer, profile_pic_path=String)
+
+##########################
+## users_follow_list
+##########################
+
+INSERT_FOLLOW = statement("""
+    insert into users_follow_list(
+        user_id,
+        follow_user_id
+    ) values (
+        :id,
+        :follow
+    )
+""", id=Integer, follow=Integer)
+
+INSERT_FOLLOW_IGNORE = statement("""
+    insert ignore into users_follow_list(
+        user_id,
+        follow_user_id
+    ) values (
+        :id,
+        :follow
+    )
+""", id=Integer, follow=Integer)
+
+DELETE_FOLLOW = statement("""
+    delete from users_follow_list
+    where user_id = :id
+        and follow_user_id = :unfollow
+""", id=Integer, unfollow=Integer)
+
+DELETE_FOLLOWS = statement("""
+    delete from users_follow_list
+    where user_id = :id
+        and follow_user_id in :ids
+""", expanding=('ids',), id=Integer, ids=Integer)
+
+FOLLOWING_IDS = statement("""
+    select follow_user_id
+    from users_follow_list
+    where user_id = :id
+        and follow_user_id in :ids
+""", expanding=('ids',), id=Integer, ids=Integer)
+
+FOLLOWING_IDS_FOR_UPDATE = statement("""
+    select follow_user_id
+    from users_follow_list
+    where user_id = :id
+        and follow_user_id in :ids
+    for update
+""", expanding=('ids',), id=Integer, ids=Integer)
+
+FOLLOWER_IDS = statement("""
+    select user_id
+    from users_follow_list
+    where follow_user_id = :user_id
+""", user_id=Integer)
+
+FOLLOW_EDGES = statement("""
+    select
+        user_id,
+        follow_user_id
+    from users_follow_list
+""")
+
+##########################
+## profile_picture_uploads
+##########################
+
+INSERT_PICTURE_UPLOAD = statement("""
+    insert into profile_picture_uploads(
+        user_id,
+        filename,
+        status
+    ) values (
+        :user_id,
+        :filename,
+        'pending'
+    )
+""", user_id=Integer, filename=String)
+
+COMPLETE_PICTURE_UPLOAD = statement("""
+    update profile_picture_uploads
+    set status = 'done',
+        url = :profile_pic_path
+    where id = :upload_id
+""", upload_id=Integer, profile_pic_path=String)
+
+FAIL_PICTURE_UPLOAD = statement("""
+    update profile_picture_uploads
+    set status = 'failed'
+    where id = :upload_id
+""", upload_id=Integer)
+
+PICTURE_UPLOAD = statement("""
+    select
+        id,
+        user_id,
+        status,
+        url
+    from profile_picture_uploads
+    where id = :upload_id
+""", upload_id=Integer)
@@ -0,0 +1,116 @@
+from .records       import Tweet
+from .tweet_dao     import MAX_TWEET_ID
+from .engine_router import EngineRouter
+from .statements    import (
+    FANOUT_TIMELINE,
+    PUSH_TWEET,
+    PUSH_TWEETS_SINCE,
+    ADD_FOLLOWEE,
+    REMOVE_FOLLOWEE,
+    CLEAR_TIMELINE,
+    REBUILD_TIMELINE,
+    TIMELINE_CUTOFFS,
+    TIMELINE_CUTOFF,
+    TRIM_TIMELINE
+)
+
+# each users_timeline keeps only its newest MAX_LENGTH tweet ids; older pages are not served from fan-out
+MAX_LENGTH = 800
+
+class TimelineDao:
+    def __init__(self, database, max_length=MAX_LENGTH):
+        self.db         = EngineRouter.wrap(database)
+        self.max_length = max_length
+
+    def push_tweet(self, user_id, tweet_id):
+        rowcount = self.db.execute(PUSH_TWEET, {
+            'user_id'   : user_id,
+            'tweet_id'  : tweet_id
+        }).rowcount
+        self.trim_recipients(user_id)
+
+        return rowcount
+
+    def push_tweets_since(self, user_id, since_id):
+        rowcount = self.db.execute(PUSH_TWEETS_SINCE, {
+            'user_id'   : user_id,
+            'since_id'  : since_id
+        }).rowcount
+        self.trim_recipients(user_id)
+
+        return rowcount
+
+    def add_followee(self, user_id, follow_id):
+        rowcount = self.db.execute(ADD_FOLLOWEE, {
+            'user_id'   : user_id,
+            'follow_id' : follow_id,
+            'limit'     : self.max_length
+        }).rowcount
+        self.trim(user_id)
+
+        return rowcount
+
+    def trim(self, user_id):
+        row = self.db.execute(TIMELINE_CUTOFF, {
+            'user_id'   : user_id,
+            'offset'    : self.max_length
+        }).fetchone()
+        if row is None:
+            return 0
+
+        return self.db.execute(TRIM_TIMELINE, {
+            'user_id'   : user_id,
+            'cutoff'    : row[0]
+        }).rowcount
+
+    def trim_recipients(self, user_id):
+        cutoffs = [{
+            'user_id'   : recipient_id,
+            'cutoff'    : cutoff
+        } for recipient_id, cutoff in self.db.execute(TIMELINE_CUTOFFS, {
+            'user_id'   : user_id,
+            'offset'    : self.max_length
+        }) if cutoff is not None]
+
+        if not cutoffs:
+            return 0
+
+        return self.db.execute(TRIM_TIMELINE, cutoffs).rowcount
+
+    def remove_followee(self, user_id, unfollow_id):
+        return self.db.execute(REMOVE_FOLLOWEE, {
+            'user_id'       : user_id,
+            'unfollow_id'   : unfollow_id
+        }).rowcount
+
+    def rebuild(self, user_id):
+        with self.db.begin() as conn:
+            conn.execute(CLEAR_TIMELINE, {'user_id' : user_id})
+
+            return conn.execute(REBUILD_TIMELINE, {
+                'user_id'   : user_id,
+                'limit'     : self.max_length
+            }).rowcount
+
+    def get_timeline(self, user_id, before=None, limit=20):
+        rows = self.db.reader(user_id).execute(FANOUT_TIMELINE, {
+            'user_id'   : user_id,
+            'before'    : before or MAX_TWEET_ID,
+            'limit'     : limit
+        }).fetchall()
+
+        return [Tweet(*row) for row in rows]
+
+    def iter_timeline(self, user_id, before=None, limit=None, batch_size=500):
+        with self.db.reader(user_id).connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(FANOUT_TIMELINE, {
+                'user_id'   : user_id,
+                'before'    : before or MAX_TWEET_ID,
+                'limit'     : limit or MAX_TWEET_ID
+            })
+
+            rows = result.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    yield Tweet(*row)
+                rows = result.fetchmany(batch_size)
@@ -1,40 +1,115 @@
-from sqlalchemy     import text
+import heapq
+
+from itertools      import groupby
+from .records       import Tweet
+from .engine_router import EngineRouter
+from .statements    import INSERT_TWEET, LAST_TWEET_ID, TIMELINE, USERS_TIMELINE, FOLLOWEE_TIMELINES, TIMELINE_VERSION
+
+MAX_TWEET_ID = 2 ** 63 - 1
+
+
+def merge_timelines(runs, limit):
+    # runs are newest-first; a heap over their heads yields the newest `limit` in O(limit log len(runs))
+    timeline    = []
+    last_id     = None
+
+    for tweet in heapq.merge(*runs, key=lambda tweet: tweet.id, reverse=True):
+        if tweet.id == last_id:
+            continue
+
+        timeline.append(tweet)
+        last_id = tweet.id
+        if len(timeline) == limit:
+            break
+
+    return timeline
+
 
 class TweetDao:
     def __init__(self, database):
-        self.db     = database
+        self.db     = EngineRouter.wrap(database)
 
     def insert_tweet(self, user_id, tweet):
-        return self.db.execute(text("""
-            insert into tweets (
-                user_id,
-                tweet
-            ) values (
-                :id,
-                :tweet
-            )
-        """), {
+        self.db.mark_write(user_id)
+        return self.db.execute(INSERT_TWEET, {
             'id'    : user_id,
             'tweet' : tweet
-        }).rowcount
+        }).lastrowid
+
+    def insert_tweets(self, user_id, tweets, chunk_size=1000):
+        return self.insert_tweet_rows([(user_id, tweet) for tweet in tweets], chunk_size)
+
+    def insert_tweet_rows(self, rows, chunk_size=1000):
+        rowcount = 0
+        for user_id in {user_id for user_id, _ in rows}:
+            self.db.mark_write(user_id)
+
+        with self.db.begin() as conn:
+            for start in range(0, len(rows), chunk_size):
+                rowcount += conn.execute(INSERT_TWEET, [{
+                    'id'    : user_id,
+                    'tweet' : tweet
+                } for user_id, tweet in rows[start:start + chunk_size]]).rowcount
+
+        return rowcount
+
+    def get_last_tweet_id(self, user_id):
+        row = self.db.execute(LAST_TWEET_ID, {'user_id' : user_id}).fetchone()
+
+        return row['id'] or 0
+
+    def get_timeline(self, user_id, before=None, limit=20):
+        rows = self.db.reader(user_id).execute(TIMELINE, {
+            'user_id'   : user_id,
+            'before'    : before or MAX_TWEET_ID,
+            'limit'     : limit
+        }).fetchall()
+
+        return [Tweet(*row) for row in rows]
+
+    def get_users_timeline(self, user_id, followee_ids, before=None, limit=20):
+        rows = self.db.reader(user_id).execute(USERS_TIMELINE, {
+            'user_ids'  : [user_id, *followee_ids],
+            'before'    : before or MAX_TWEET_ID,
+            'limit'     : limit
+        }).fetchall()
+
+        return [Tweet(*row) for row in rows]
+
+    def get_merged_timeline(self, user_id, before=None, limit=20):
+        rows = self.db.reader(user_id).execute(FOLLOWEE_TIMELINES, {
+            'user_id'   : user_id,
+            'before'    : before or MAX_TWEET_ID,
+            'limit'     : limit
+        }).fetchall()
 
-    def get_timeline(self, user_id):
-        rows = self.db.execute(text("""
-            select 
-                t.user_id,
-                t.tweet
-            from tweets t
-            left join users_follow_list ufl
-                on ufl.user_id = :user_id
-            where t.user_id = :user_id
-                or t.user_id = ufl.follow_user_id
-        """),{'user_id' : user_id}).fetchall()
+        runs = [
+            [Tweet(*row) for row in author_rows]
+            for _, author_rows in groupby(rows, key=lambda row: row[1])
+        ]
 
-        return [{
-            'user_id'       : row['user_id'],
-            'tweet'         : row['tweet']
-        } for row in rows]
+        return merge_timelines(runs, limit)
 
+    def get_timeline_version(self, user_id):
+        row = self.db.reader(user_id).execute(TIMELINE_VERSION, {'user_id' : user_id}).fetchone()
 
+        return {
+            'latest_id'     : row['latest_id'],
+            'follows'       : row['follows'],
+            'follow_hash'   : row['follow_hash'],
+            'latest_at'     : row['latest_at']
+        }
 
+    def iter_timeline(self, user_id, before=None, limit=None, batch_size=500):
+        with self.db.reader(user_id).connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(TIMELINE, {
+                'user_id'   : user_id,
+                'before'    : before or MAX_TWEET_ID,
+                'limit'     : limit or MAX_TWEET_ID
+            })
 
+            rows = result.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    yield Tweet(*row)
+                rows = result.fetchmany(batch_size)
@@ -1,78 +1,182 @@
-from sqlalchemy     import text
+from .records       import UserCredential
+from .engine_router import EngineRouter
+from .statements    import (
+    INSERT_USER,
+    USER_CREDENTIAL,
+    EXISTING_USER_IDS,
+    PROFILE_PICTURE,
+    PROFILE_PICTURES,
+    SAVE_PROFILE_PICTURE,
+    SWAP_PROFILE_PICTURE,
+    INSERT_FOLLOW,
+    INSERT_FOLLOW_IGNORE,
+    DELETE_FOLLOW,
+    DELETE_FOLLOWS,
+    FOLLOWING_IDS,
+    FOLLOWING_IDS_FOR_UPDATE,
+    FOLLOWER_IDS,
+    FOLLOW_EDGES,
+    INSERT_PICTURE_UPLOAD,
+    COMPLETE_PICTURE_UPLOAD,
+    FAIL_PICTURE_UPLOAD,
+    PICTURE_UPLOAD
+)
 
 
 class UserDao:
+    # readers returning {user_id : value}, one entry per row (see metrics.instrument_dao)
+    keyed_reads = ('get_profile_pictures',)
+
     def __init__(self, database):
-        self.db = database
+        self.db = EngineRouter.wrap(database)
 
     def insert_user(self, user):
-        return self.db.execute(text("""
-            insert into users(
-                name,
-                email,
-                profile,
-                hashed_password
-            ) values (
-                :name,
-                :email,
-                :profile,
-                :password
-            )
-        """), user).lastrowid
+        user_id = self.db.execute(INSERT_USER, user).lastrowid
+        self.db.mark_write(user_id)
+
+        return user_id
 
     def get_user_id_and_password(self,email):
-        row = self.db.execute(text("""
-            select 
-                id,
-                hashed_password
-            from users
-            where email = :email
-        """),{'email':email}).fetchone()
+        row = self.db.execute(USER_CREDENTIAL,{'email':email}).fetchone()
     
-        return {
-            'id'                : row['id'],
-            'hashed_password'   : row['hashed_password']
-        }
+        return UserCredential(row['id'], row['hashed_password']) if row else None
 
     def insert_follow(self,user_id, follow_id):
-        return self.db.execute(text("""
-            insert into users_follow_list(
-                user_id,
-                follow_user_id
-            ) values (
-                :id,
-                :follow
-            )
-        """), {
+        self.db.mark_write(user_id)
+        return self.db.execute(INSERT_FOLLOW, {
             'id'        : user_id,
             'follow'    : follow_id
         }).rowcount
 
     def insert_unfollow(self,user_id, unfollow_id):
-        return self.db.execute(text("""
-            delete from users_follow_list
-            where user_id = :id 
-                and follow_user_id = :unfollow
-        """), {
+        self.db.mark_write(user_id)
+        return self.db.execute(DELETE_FOLLOW, {
             'id'        : user_id,
             'unfollow'  : unfollow_id
         }).rowcount
 
+    def insert_follows(self, user_id, follow_ids):
+        follow_ids = list(dict.fromkeys(follow_ids))
+        self.db.mark_write(user_id)
+
+        with self.db.begin() as conn:
+            users = {row[0] for row in conn.execute(EXISTING_USER_IDS, {'ids' : follow_ids})}
+
+            following = {row[0] for row in conn.execute(FOLLOWING_IDS, {
+                'id'    : user_id,
+                'ids'   : follow_ids
+            })}
+
+            # a self-follow would return the user's own tweets twice from TIMELINE
+            new_ids = [
+                follow_id for follow_id in follow_ids
+                if follow_id != user_id and follow_id in users and follow_id not in following
+            ]
+            if new_ids:
+                conn.execute(INSERT_FOLLOW_IGNORE, [{
+                    'id'        : user_id,
+                    'follow'    : follow_id
+                } for follow_id in new_ids])
+
+        return {
+            follow_id : (
+                'self'                  if follow_id == user_id else
+                'not_found'             if follow_id not in users else
+                'already_following'     if follow_id in following else
+                'followed'
+            ) for follow_id in follow_ids
+        }
+
+    def insert_unfollows(self, user_id, unfollow_ids):
+        unfollow_ids = list(dict.fromkeys(unfollow_ids))
+        self.db.mark_write(user_id)
+
+        with self.db.begin() as conn:
+            following = {row[0] for row in conn.execute(FOLLOWING_IDS_FOR_UPDATE, {
+                'id'    : user_id,
+                'ids'   : unfollow_ids
+            })}
+
+            if following:
+                conn.execute(DELETE_FOLLOWS, {
+                    'id'    : user_id,
+                    'ids'   : list(following)
+                })
+
+        return {
+            unfollow_id : 'unfollowed' if unfollow_id in following else 'not_following'
+            for unfollow_id in unfollow_ids
+        }
+
+    def get_follower_ids(self, user_id):
+        rows = self.db.reader(user_id).execute(FOLLOWER_IDS, {'user_id' : user_id}).fetchall()
+
+        return [row['user_id'] for row in rows]
+
+    def iter_follow_edges(self, batch_size=10000):
+        # FollowGraph.load swaps this snapshot in whole; a lagging replica would drop follows made just before the scan
+        with self.db.primary.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(FOLLOW_EDGES)
+
+            rows = result.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    yield row[0], row[1]
+                rows = result.fetchmany(batch_size)
+
     def save_profile_picture(self, profile_pic_path, user_id):
-        return self.db.execute(text("""
-            update users
-            set profile_picture = :profile_pic_path
-            where id = :user_id"""),{
-                'user_id'           : user_id, 
-                'profile_pic_path'   : profile_pic_path
-            }).rowcount
+        self.db.mark_write(user_id)
+        return self.db.execute(SAVE_PROFILE_PICTURE, {
+            'user_id'           : user_id,
+            'profile_pic_path'  : profile_pic_path
+        }).rowcount
 
     def get_profile_picture(self, user_id):
-        row = self.db.execute(text("""
-            select profile_picture
-            from users
-            where id = :user_id"""),{
-                'user_id'    : user_id
-            }).fetchone()
+        row = self.db.reader(user_id).execute(PROFILE_PICTURE, {'user_id' : user_id}).fetchone()
 
         return row['profile_picture'] if row else None
+
+    def get_profile_pictures(self, user_ids):
+        # ids written inside the read-your-writes window go to the primary, the rest to a replica
+        recent  = [user_id for user_id in user_ids if self.db.wrote_recently(user_id)]
+        others  = [user_id for user_id in user_ids if not self.db.wrote_recently(user_id)]
+        rows    = []
+
+        for engine, ids in ((self.db.primary, recent), (self.db.reader(), others)):
+            if ids:
+                rows.extend(engine.execute(PROFILE_PICTURES, {'user_ids' : ids}).fetchall())
+
+        return {row['id'] : row['profile_picture'] for row in rows}
+
+    def insert_profile_picture_upload(self, user_id, filename):
+        return self.db.execute(INSERT_PICTURE_UPLOAD, {
+            'user_id'   : user_id,
+            'filename'  : filename
+        }).lastrowid
+
+    def complete_profile_picture_upload(self, upload_id, user_id, profile_pic_path):
+        self.db.mark_write(user_id)
+        with self.db.begin() as conn:
+            conn.execute(COMPLETE_PICTURE_UPLOAD, {
+                'upload_id'         : upload_id,
+                'profile_pic_path'  : profile_pic_path
+            })
+
+            return conn.execute(SWAP_PROFILE_PICTURE, {
+                'user_id'           : user_id,
+                'upload_id'         : upload_id,
+                'profile_pic_path'  : profile_pic_path
+            }).rowcount
+
+    def fail_profile_picture_upload(self, upload_id):
+        return self.db.execute(FAIL_PICTURE_UPLOAD, {'upload_id' : upload_id}).rowcount
+
+    def get_profile_picture_upload(self, upload_id):
+        row = self.db.execute(PICTURE_UPLOAD, {'upload_id' : upload_id}).fetchone()
+
+        return {
+            'id'        : row['id'],
+            'user_id'   : row['user_id'],
+            'status'    : row['status'],
+            'url'       : row['url']
+        } if row else None
@@ -1,7 +1,28 @@
 from .user_service      import UserService
 from .tweet_service     import TweetService
+from .timeline_cache    import LRUCache, LocalTimelineCache, RemoteTimelineCache
+from .password_hasher   import PasswordHasher, PasswordHasherBusy
+from .storage           import S3Storage, LocalStorage
+from .profile_picture_uploader  import ProfilePictureUploader
+from .follow_graph      import FollowGraph
+from .tweet_buffer      import TweetWriteBuffer, TweetBufferFull, TweetBufferTimeout
+from .async_service     import AsyncUserService, AsyncTweetService
 
 __all__ = [
     'UserService',
-    'TweetService'
+    'TweetService',
+    'LRUCache',
+    'LocalTimelineCache',
+    'RemoteTimelineCache',
+    'PasswordHasher',
+    'PasswordHasherBusy',
+    'S3Storage',
+    'LocalStorage',
+    'ProfilePictureUploader',
+    'FollowGraph',
+    'TweetWriteBuffer',
+    'TweetBufferFull',
+    'TweetBufferTimeout',
+    'AsyncUserService',
+    'AsyncTweetService'
 ]
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import shutil
+import tempfile
+
+from datetime           import datetime, timedelta
+from .password_hasher   import PasswordHasher
+from .tweet_service     import (
+    MAX_TWEET_LENGTH,
+    clamp_timeline_limit,
+    timeline_page,
+    timeline_version_key,
+    timeline_etag
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncUserService:
+    def __init__(self, user_dao, config, timeline_cache=None, password_hasher=None, follow_graph=None, storage=None):
+        self.user_dao       = user_dao
+        self.config         = config
+        self.timeline_cache = timeline_cache
+        self.follow_graph   = follow_graph
+        self.hasher         = password_hasher or PasswordHasher(config.get('BCRYPT_ROUNDS', 12))
+        self.storage        = storage
+        self.uploads        = set()
+
+    async def run_blocking(self, fn, *args):
+        # bcrypt and storage uploads hold the calling thread; keep them off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def create_new_user(self, new_user):
+        new_user['password']    = await self.run_blocking(self.hasher.hash, new_user['password'])
+        new_user_id             = await self.user_dao.insert_user(new_user)
+
+        return new_user_id
+
+    async def login(self, credential):
+        user_credential = await self.user_dao.get_user_id_and_password(credential['email'])
+        authorized      = user_credential and await self.run_blocking(
+            self.hasher.check,
+            credential['password'],
+            user_credential.hashed_password
+        )
+
+        if authorized:
+            return authorized, user_credential.id
+        else:
+            return authorized, None
+
+    def generate_access_token(self, user_id):
+        import jwt
+
+        payload     = {
+            'user_id'   : user_id,
+            'exp'       : datetime.utcnow() + timedelta(seconds=60 * 60)
+        }
+        token       = jwt.encode(payload, self.config['JWT_SECRET_KEY'], 'HS256')
+
+        return token.decode('utf-8')
+
+    async def follow(self, user_id, follow_id):
+        result = await self.user_dao.insert_follow(user_id, follow_id)
+
+        if self.follow_graph:
+            self.follow_graph.follow(user_id, follow_id)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
+
+        return result
+
+    async def unfollow(self, user_id, unfollow_id):
+        result = await self.user_dao.insert_unfollow(user_id, unfollow_id)
+
+        if self.follow_graph:
+            self.follow_graph.unfollow(user_id, unfollow_id)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
+
+        return result
+
+    async def follows(self, user_id, follow_ids):
+        results     = await self.user_dao.insert_follows(user_id, follow_ids)
+        followed    = [follow_id for follow_id, result in results.items() if result == 'followed']
+
+        if self.follow_graph:
+            for follow_id in followed:
+                self.follow_graph.follow(user_id, follow_id)
+
+        if followed and self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
+
+        return results
+
+    async def unfollows(self, user_id, unfollow_ids):
+        results     = await self.user_dao.insert_unfollows(user_id, unfollow_ids)
+        unfollowed  = [unfollow_id for unfollow_id, result in results.items() if result == 'unfollowed']
+
+        if self.follow_graph:
+            for unfollow_id in unfollowed:
+                self.follow_graph.unfollow(user_id, unfollow_id)
+
+        if unfollowed and self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
+
+        return results
+
+    async def upload_profile_picture(self, picture, filename, user_id):
+        if not self.config.get('PROFILE_PICTURE_ASYNC'):
+            image_url = await self.run_blocking(self.storage.upload, picture, filename)
+            await self.user_dao.save_profile_picture(image_url, user_id)
+            return None
+
+        spooled = tempfile.SpooledTemporaryFile(max_size=self.config.get('PROFILE_PICTURE_SPOOL_SIZE', 1024 * 1024))
+        shutil.copyfileobj(picture, spooled)
+        spooled.seek(0)
+
+        upload_id   = await self.user_dao.insert_profile_picture_upload(user_id, filename)
+        task        = asyncio.ensure_future(self.finish_upload(upload_id, spooled, filename, user_id))
+        self.uploads.add(task)
+        task.add_done_callback(self.uploads.discard)
+
+        return upload_id
+
+    async def finish_upload(self, upload_id, picture, filename, user_id):
+        try:
+            image_url = await self.run_blocking(self.storage.upload, picture, filename)
+        except Exception:
+            logger.exception('profile picture upload %s failed', upload_id)
+            await self.user_dao.fail_profile_picture_upload(upload_id)
+            return
+        finally:
+            picture.close()
+
+        try:
+            await self.user_dao.complete_profile_picture_upload(upload_id, user_id, image_url)
+        except Exception:
+            logger.exception('profile picture upload %s could not be completed', upload_id)
+            await self.user_dao.fail_profile_picture_upload(upload_id)
+
+    async def shutdown(self):
+        if self.uploads:
+            await asyncio.wait(self.uploads)
+
+    async def get_profile_picture_upload(self, upload_id):
+        return await self.user_dao.get_profile_picture_upload(upload_id)
+
+    async def get_profile_picture(self, user_id):
+        return await self.user_dao.get_profile_picture(user_id)
+
+    async def get_profile_pictures(self, user_ids):
+        return await self.user_dao.get_profile_pictures(set(user_ids))
+
+
+class AsyncTweetService:
+    def __init__(self, tweet_dao, user_dao=None, timeline_cache=None, follow_graph=None):
+        self.tweet_dao      = tweet_dao
+        self.user_dao       = user_dao
+        self.timeline_cache = timeline_cache
+        self.follow_graph   = follow_graph
+
+    async def get_follower_ids(self, user_id):
+        if self.follow_graph:
+            return self.follow_graph.get_followers(user_id)
+
+        return await self.user_dao.get_follower_ids(user_id)
+
+    async def tweet(self, user_id, tweet):
+        if len(tweet) > MAX_TWEET_LENGTH:
+            return None
+
+        tweet_id = await self.tweet_dao.insert_tweet(user_id, tweet)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id, *await self.get_follower_ids(user_id))
+
+        return tweet_id
+
+    async def tweets(self, user_id, tweets):
+        results = [{
+            'index'     : index,
+            'status'    : 'created' if len(tweet) <= MAX_TWEET_LENGTH else 'too_long'
+        } for index, tweet in enumerate(tweets)]
+        valid_tweets = [tweet for tweet in tweets if len(tweet) <= MAX_TWEET_LENGTH]
+
+        if not valid_tweets:
+            return results
+
+        await self.tweet_dao.insert_tweets(user_id, valid_tweets)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id, *await self.get_follower_ids(user_id))
+
+        return results
+
+    async def timeline(self, user_id, before=None, limit=None):
+        limit = clamp_timeline_limit(limit)
+
+        if self.timeline_cache:
+            cache_key   = self.timeline_cache.key(user_id, before, limit)
+            page        = self.timeline_cache.get(cache_key)
+            if page is not None:
+                return page
+
+        if self.follow_graph:
+            followee_ids    = self.follow_graph.get_followees(user_id)
+            timeline        = await self.tweet_dao.get_users_timeline(user_id, followee_ids, before, limit + 1)
+        else:
+            timeline = await self.tweet_dao.get_timeline(user_id, before, limit + 1)
+
+        page = timeline_page(timeline, limit)
+
+        if self.timeline_cache:
+            self.timeline_cache.set(cache_key, page)
+
+        return page
+
+    async def timeline_version(self, user_id, *params):
+        if self.timeline_cache:
+            cache_key   = timeline_version_key(self.timeline_cache, user_id, params)
+            cached      = self.timeline_cache.get_version(cache_key)
+            if cached is not None:
+                return cached
+
+        result = timeline_etag(user_id, await self.tweet_dao.get_timeline_version(user_id), params)
+
+        if self.timeline_cache:
+            self.timeline_cache.set_version(cache_key, result)
+
+        return result
@@ -0,0 +1,145 @@
+import logging
+import sys
+import threading
+
+from array      import array
+from bisect     import bisect_left
+
+# users.id is a signed 32-bit INT, so each direction of an edge costs 4 bytes
+TYPECODE = 'i'
+
+logger = logging.getLogger(__name__)
+
+
+def insert_sorted(index, key, value):
+    values = index.get(key)
+    if values is None:
+        index[key] = array(TYPECODE, (value,))
+        return True
+
+    position = bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        return False
+
+    values.insert(position, value)
+    return True
+
+def remove_sorted(index, key, value):
+    values = index.get(key)
+    if values is None:
+        return False
+
+    position = bisect_left(values, value)
+    if position == len(values) or values[position] != value:
+        return False
+
+    del values[position]
+    if not values:
+        del index[key]
+    return True
+
+def sort_unique(values):
+    return array(TYPECODE, sorted(set(values)))
+
+
+class FollowGraph:
+    def __init__(self):
+        self.followees  = {}
+        self.followers  = {}
+        self.edges      = 0
+        self.lock       = threading.Lock()
+        self.journal    = None
+        self.stopped    = threading.Event()
+
+    def load(self, edges):
+        followees   = {}
+        followers   = {}
+
+        # changes made while the edges are streamed may or may not be in them; replay after the swap
+        with self.lock:
+            self.journal = []
+
+        for user_id, follow_id in edges:
+            if user_id not in followees:
+                followees[user_id] = array(TYPECODE)
+            followees[user_id].append(follow_id)
+
+            if follow_id not in followers:
+                followers[follow_id] = array(TYPECODE)
+            followers[follow_id].append(user_id)
+
+        for index in (followees, followers):
+            for key, values in index.items():
+                index[key] = sort_unique(values)
+
+        with self.lock:
+            journal         = self.journal
+            self.journal    = None
+            self.followees  = followees
+            self.followers  = followers
+            self.edges      = sum(len(values) for values in followees.values())
+
+        for change, user_id, follow_id in journal:
+            change(user_id, follow_id)
+
+        return self.edges
+
+    def start_reloading(self, load_edges, interval):
+        # other worker processes write users_follow_list too; re-read it so their changes show up here
+        def run():
+            while not self.stopped.wait(interval):
+                try:
+                    self.load(load_edges())
+                except Exception:
+                    logger.exception('failed to reload the follow graph')
+
+        thread = threading.Thread(target=run, name='follow-graph-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def stop_reloading(self):
+        self.stopped.set()
+
+    def follow(self, user_id, follow_id):
+        with self.lock:
+            if self.journal is not None:
+                self.journal.append((self.follow, user_id, follow_id))
+            if not insert_sorted(self.followees, user_id, follow_id):
+                return False
+            insert_sorted(self.followers, follow_id, user_id)
+            self.edges += 1
+            return True
+
+    def unfollow(self, user_id, unfollow_id):
+        with self.lock:
+            if self.journal is not None:
+                self.journal.append((self.unfollow, user_id, unfollow_id))
+            if not remove_sorted(self.followees, user_id, unfollow_id):
+                return False
+            remove_sorted(self.followers, unfollow_id, user_id)
+            self.edges -= 1
+            return True
+
+    def get_followees(self, user_id):
+        with self.lock:
+            return self.followees.get(user_id, array(TYPECODE))[:]
+
+    def get_followers(self, user_id):
+        with self.lock:
+            return self.followers.get(user_id, array(TYPECODE))[:]
+
+    def is_following(self, user_id, follow_id):
+        with self.lock:
+            values = self.followees.get(user_id)
+            if values is None:
+                return False
+            position = bisect_left(values, follow_id)
+            return position < len(values) and values[position] == follow_id
+
+    def memory_usage(self):
+        with self.lock:
+            size = sys.getsizeof(self.followees) + sys.getsizeof(self.followers)
+            for index in (self.followees, self.followers):
+                for key, values in index.items():
+                    size += sys.getsizeof(key) + sys.getsizeof(values)
+            return size
@@ -0,0 +1,57 @@
+import threading
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def hash_password(password, rounds):
+    import bcrypt
+
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds))
+
+def check_password(password, hashed_password):
+    import bcrypt
+
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=0, queue_size=0, timeout=None):
+        self.rounds     = rounds
+        self.timeout    = timeout
+        self.executor   = ProcessPoolExecutor(workers) if workers else None
+        self.slots      = threading.BoundedSemaphore(workers + queue_size) if workers else None
+
+    def run(self, fn, *args):
+        if self.executor is None:
+            return fn(*args)
+
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # a hash still queued is dropped; one already running keeps its slot until it finishes
+            future.cancel()
+            raise PasswordHasherBusy()
+
+    def hash(self, password):
+        return self.run(hash_password, password, self.rounds)
+
+    def check(self, password, hashed_password):
+        return self.run(check_password, password, hashed_password)
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown()
@@ -0,0 +1,49 @@
+import logging
+import shutil
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilePictureUploader:
+    def __init__(self, storage, user_dao, workers=2, spool_size=1024 * 1024, on_complete=None):
+        self.storage        = storage
+        self.user_dao       = user_dao
+        self.spool_size     = spool_size
+        self.on_complete    = on_complete
+        self.executor   = ThreadPoolExecutor(workers)
+
+    def submit(self, picture, filename, user_id):
+        spooled = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        shutil.copyfileobj(picture, spooled)
+        spooled.seek(0)
+
+        upload_id = self.user_dao.insert_profile_picture_upload(user_id, filename)
+        self.executor.submit(self.upload, upload_id, spooled, filename, user_id)
+
+        return upload_id
+
+    def upload(self, upload_id, picture, filename, user_id):
+        try:
+            image_url = self.storage.upload(picture, filename)
+        except Exception:
+            logger.exception('profile picture upload %s failed', upload_id)
+            self.user_dao.fail_profile_picture_upload(upload_id)
+            return
+        finally:
+            picture.close()
+
+        try:
+            self.user_dao.complete_profile_picture_upload(upload_id, user_id, image_url)
+        except Exception:
+            logger.exception('profile picture upload %s could not be completed', upload_id)
+            self.user_dao.fail_profile_picture_upload(upload_id)
+            return
+
+        if self.on_complete:
+            self.on_complete(user_id)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+
+class S3Storage:
+    def __init__(self, s3_client, bucket, bucket_url, part_size=DEFAULT_PART_SIZE):
+        self.s3         = s3_client
+        self.bucket     = bucket
+        self.bucket_url = bucket_url
+        self.part_size  = part_size
+
+    def upload(self, fileobj, key):
+        from boto3.s3.transfer import TransferConfig
+
+        self.s3.upload_fileobj(
+            fileobj,
+            self.bucket,
+            key,
+            Config = TransferConfig(
+                multipart_threshold = self.part_size,
+                multipart_chunksize = self.part_size
+            )
+        )
+
+        return self.url(key)
+
+    def url(self, key):
+        return f"{self.bucket_url}{key}"
+
+
+class LocalStorage:
+    def __init__(self, root, base_url, part_size=DEFAULT_PART_SIZE):
+        self.root       = root
+        self.base_url   = base_url
+        self.part_size  = part_size
+
+    def upload(self, fileobj, key):
+        path            = os.path.join(self.root, key)
+        fd, tmp_path    = tempfile.mkstemp(dir=self.root)
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(fileobj, f, self.part_size)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+        return self.url(key)
+
+    def url(self, key):
+        return f"{self.base_url}{key}"
@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+
+from collections    import OrderedDict
+from datetime       import datetime
+from model.records   import Tweet
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize    = maxsize
+        self.ttl        = ttl
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+        self.entries    = OrderedDict()
+        self.lock       = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl         = self.ttl if ttl is None else ttl
+        expires_at  = time.monotonic() + ttl if ttl else None
+
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            return self.entries.pop(key, None) is not None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            'hits'      : self.hits,
+            'misses'    : self.misses,
+            'evictions' : self.evictions,
+            'size'      : len(self.entries)
+        }
+
+
+class LocalTimelineCache:
+    def __init__(self, maxsize=10000, ttl=30, versions_maxsize=None):
+        self.cache              = LRUCache(maxsize, ttl)
+        self.ttl                = ttl
+        self.versions_maxsize   = versions_maxsize or 10 * maxsize
+        # user_id -> (version, expires_at), oldest invalidation first. A version lives for the page ttl,
+        # so once it is dropped every page filed under an older version has expired too
+        self.versions           = OrderedDict()
+        # versions come from one counter, so a user whose entry was dropped never reuses a number
+        self.counter            = 0
+        # version of users without an entry; raised when a live entry has to be evicted
+        self.floor              = 0
+
+    # callers take the key before reading the DB and store under that same key, so a page
+    # read while an invalidation lands is filed under the old version and never served
+    def key(self, user_id, before, limit):
+        entry   = self.versions.get(user_id)
+        version = entry[0] if entry is not None and entry[1] > time.monotonic() else self.floor
+
+        return (user_id, version, before, limit)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, page):
+        self.cache.set(key, page)
+
+    def get_version(self, key):
+        return self.cache.get(key)
+
+    def set_version(self, key, version):
+        self.cache.set(key, version)
+
+    def invalidate(self, *user_ids):
+        now = time.monotonic()
+
+        with self.cache.lock:
+            for user_id in user_ids:
+                self.counter            += 1
+                self.versions[user_id]   = (self.counter, now + self.ttl)
+                self.versions.move_to_end(user_id)
+
+            while self.versions:
+                _, (_, expires_at) = next(iter(self.versions.items()))
+                if expires_at > now and len(self.versions) <= self.versions_maxsize:
+                    break
+
+                self.versions.popitem(last=False)
+                if expires_at > now:
+                    self.floor = self.counter
+
+    def stats(self):
+        return dict(self.cache.stats(), versions=len(self.versions))
+
+
+class RemoteTimelineCache:
+    # client: get(key), set(key, value, ttl), incr(key) -- incr creates missing keys
+    def __init__(self, client, ttl=30, prefix='timeline'):
+        self.client     = client
+        self.ttl        = ttl
+        self.prefix     = prefix
+        self.hits       = 0
+        self.misses     = 0
+
+    def version_key(self, user_id):
+        return f"{self.prefix}:{user_id}:version"
+
+    def key(self, user_id, before, limit):
+        version = self.client.get(self.version_key(user_id)) or 0
+        return f"{self.prefix}:{user_id}:{int(version)}:{before}:{limit}"
+
+    def get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        timeline, next_cursor = json.loads(value)
+        return [Tweet(*tweet) for tweet in timeline], next_cursor
+
+    def set(self, key, page):
+        timeline, next_cursor = page
+        value = json.dumps([[list(tweet) for tweet in timeline], next_cursor])
+
+        self.client.set(key, value, self.ttl)
+
+    def get_version(self, key):
+        value = self.client.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        etag, last_modified = json.loads(value)
+        return etag, datetime.fromisoformat(last_modified) if last_modified else None
+
+    def set_version(self, key, version):
+        etag, last_modified = version
+        value = json.dumps([etag, last_modified.isoformat() if last_modified else None])
+
+        self.client.set(key, value, self.ttl)
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            self.client.incr(self.version_key(user_id))
+
+    def stats(self):
+        return {
+            'hits'      : self.hits,
+            'misses'    : self.misses,
+            'evictions' : 0
+        }
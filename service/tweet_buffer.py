@@ -0,0 +1,97 @@
+import atexit
+import logging
+import threading
+
+from collections    import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TweetBufferFull(Exception):
+    pass
+
+class TweetBufferTimeout(Exception):
+    pass
+
+
+class PendingTweet:
+    __slots__ = ('user_id', 'tweet', 'done', 'error')
+
+    def __init__(self, user_id, tweet):
+        self.user_id    = user_id
+        self.tweet      = tweet
+        self.done       = threading.Event()
+        self.error      = None
+
+
+class TweetWriteBuffer:
+    def __init__(self, write, max_size=10000, batch_size=500, flush_interval=0.05, ack='buffered', ack_timeout=5):
+        if ack not in ('buffered', 'flushed'):
+            raise ValueError(f"unknown ack mode '{ack}'")
+
+        self.write          = write
+        self.max_size       = max_size
+        self.batch_size     = batch_size
+        self.flush_interval = flush_interval
+        self.ack            = ack
+        self.ack_timeout    = ack_timeout
+        self.queue          = deque()
+        self.closed         = False
+        self.condition      = threading.Condition()
+        self.thread         = threading.Thread(target=self.run, name='tweet-write-buffer', daemon=True)
+        self.thread.start()
+
+        atexit.register(self.close)
+
+    def submit(self, user_id, tweet):
+        pending = PendingTweet(user_id, tweet)
+
+        with self.condition:
+            if self.closed:
+                raise TweetBufferFull('tweet buffer is closed')
+            if len(self.queue) >= self.max_size:
+                raise TweetBufferFull()
+
+            self.queue.append(pending)
+            self.condition.notify()
+
+        if self.ack == 'flushed':
+            if not pending.done.wait(self.ack_timeout):
+                raise TweetBufferTimeout()
+            if pending.error:
+                raise pending.error
+
+        return pending
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or self.queue)
+                self.condition.wait_for(
+                    lambda: self.closed or len(self.queue) >= self.batch_size,
+                    timeout = self.flush_interval
+                )
+                if not self.queue:
+                    return
+
+                batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+
+            self.flush(batch)
+
+    def flush(self, batch):
+        try:
+            self.write(batch)
+        except Exception as e:
+            logger.exception('failed to flush %d buffered tweets', len(batch))
+            for pending in batch:
+                pending.error = e
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def close(self, timeout=None):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+        self.thread.join(timeout)
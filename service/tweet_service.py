@@ -1,14 +1,168 @@
+import hashlib
+
+from .tweet_buffer  import TweetWriteBuffer
+
+MAX_TWEET_LENGTH        = 300
+DEFAULT_TIMELINE_LIMIT  = 20
+MAX_TIMELINE_LIMIT      = 100
+
+
+# shared by TweetService and AsyncTweetService; only the DAO calls differ between the two
+def clamp_timeline_limit(limit):
+    if not limit or limit < 0:
+        return DEFAULT_TIMELINE_LIMIT
+
+    return min(limit, MAX_TIMELINE_LIMIT)
+
+def timeline_page(timeline, limit):
+    # timeline was fetched with limit + 1 rows
+    next_cursor = timeline[limit - 1].id if len(timeline) > limit else None
+
+    return (timeline[:limit], next_cursor)
+
+def timeline_version_key(timeline_cache, user_id, params):
+    return timeline_cache.key(user_id, 'version', ':'.join(str(param) for param in params))
+
+def timeline_etag(user_id, version, params):
+    tag = ':'.join(str(value) for value in (
+        user_id,
+        version['latest_id'],
+        version['follows'],
+        version['follow_hash'],
+        *params
+    ))
+
+    return (hashlib.sha1(tag.encode('utf-8')).hexdigest(), version['latest_at'])
 
 
 class TweetService:
-    def __init__(self, tweet_dao):
+    def __init__(self, tweet_dao, timeline_dao=None, user_dao=None, timeline_cache=None, follow_graph=None, merge_timeline=False):
         self.tweet_dao      = tweet_dao
+        self.timeline_dao   = timeline_dao
+        self.user_dao       = user_dao
+        self.timeline_cache = timeline_cache
+        self.follow_graph   = follow_graph
+        self.merge_timeline = merge_timeline
+        self.write_buffer   = None
+
+    def enable_write_behind(self, **options):
+        self.write_buffer = TweetWriteBuffer(self.write_batch, **options)
+        return self.write_buffer
+
+    def get_follower_ids(self, user_id):
+        if self.follow_graph:
+            return self.follow_graph.get_followers(user_id)
+
+        return self.user_dao.get_follower_ids(user_id)
 
     def tweet(self, user_id, tweet):
-        if len(tweet) > 300:
+        if len(tweet) > MAX_TWEET_LENGTH:
             return None
-        return self.tweet_dao.insert_tweet(user_id, tweet)
 
-    def timeline(self, user_id):
+        if self.write_buffer:
+            return self.write_buffer.submit(user_id, tweet)
+
+        tweet_id = self.tweet_dao.insert_tweet(user_id, tweet)
+
+        if self.timeline_dao:
+            self.timeline_dao.push_tweet(user_id, tweet_id)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id, *self.get_follower_ids(user_id))
+
+        return tweet_id
+
+    def tweets(self, user_id, tweets):
+        results = [{
+            'index'     : index,
+            'status'    : 'created' if len(tweet) <= MAX_TWEET_LENGTH else 'too_long'
+        } for index, tweet in enumerate(tweets)]
+        valid_tweets = [tweet for tweet in tweets if len(tweet) <= MAX_TWEET_LENGTH]
+
+        if not valid_tweets:
+            return results
+
+        since_id = self.tweet_dao.get_last_tweet_id(user_id) if self.timeline_dao else None
+        self.tweet_dao.insert_tweets(user_id, valid_tweets)
+
+        if self.timeline_dao:
+            self.timeline_dao.push_tweets_since(user_id, since_id)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id, *self.get_follower_ids(user_id))
+
+        return results
+
+    def write_batch(self, batch):
+        rows        = [(pending.user_id, pending.tweet) for pending in batch]
+        user_ids    = list(dict.fromkeys(user_id for user_id, _ in rows))
+
+        if self.timeline_dao:
+            since_ids = {user_id : self.tweet_dao.get_last_tweet_id(user_id) for user_id in user_ids}
+
+        self.tweet_dao.insert_tweet_rows(rows)
+
+        for user_id in user_ids:
+            if self.timeline_dao:
+                self.timeline_dao.push_tweets_since(user_id, since_ids[user_id])
+            if self.timeline_cache:
+                self.timeline_cache.invalidate(user_id, *self.get_follower_ids(user_id))
+
+    def timeline(self, user_id, before=None, limit=None):
+        limit = clamp_timeline_limit(limit)
+
+        if self.timeline_cache:
+            cache_key   = self.timeline_cache.key(user_id, before, limit)
+            page        = self.timeline_cache.get(cache_key)
+            if page is not None:
+                return page
+
+        if self.timeline_dao:
+            timeline = self.timeline_dao.get_timeline(user_id, before, limit + 1)
+        elif self.follow_graph:
+            followee_ids    = self.follow_graph.get_followees(user_id)
+            timeline        = self.tweet_dao.get_users_timeline(user_id, followee_ids, before, limit + 1)
+        elif self.merge_timeline:
+            timeline = self.tweet_dao.get_merged_timeline(user_id, before, limit + 1)
+        else:
+            timeline = self.tweet_dao.get_timeline(user_id, before, limit + 1)
+
+        page = timeline_page(timeline, limit)
+
+        if self.timeline_cache:
+            self.timeline_cache.set(cache_key, page)
+
+        return page
+
+    def timeline_version(self, user_id, *params):
+        # cached under the same per-user version as the pages, so tweets and follows that
+        # invalidate the timeline also invalidate its etag
+        if self.timeline_cache:
+            cache_key   = timeline_version_key(self.timeline_cache, user_id, params)
+            cached      = self.timeline_cache.get_version(cache_key)
+            if cached is not None:
+                return cached
+
+        result = timeline_etag(user_id, self.tweet_dao.get_timeline_version(user_id), params)
+
+        if self.timeline_cache:
+            self.timeline_cache.set_version(cache_key, result)
+
+        return result
+
+    def stream_timeline(self, user_id, before=None, limit=None):
+        # one extra row so the view can tell whether a next page exists
+        limit = limit + 1 if limit else None
+
+        if self.timeline_dao:
+            return self.timeline_dao.iter_timeline(user_id, before, limit)
+
+        return self.tweet_dao.iter_timeline(user_id, before, limit)
+
+    def rebuild_timeline(self, user_id):
+        result = self.timeline_dao.rebuild(user_id)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
 
-        return self.tweet_dao.get_timeline(user_id) 
+        return result
@@ -1,18 +1,36 @@
-import jwt
-import bcrypt
 from datetime       import datetime, timedelta
 import os
-import boto3
+from .password_hasher   import PasswordHasher
+from .storage           import S3Storage
+from .profile_picture_uploader  import ProfilePictureUploader
+from .timeline_cache    import LRUCache
+
+NOT_CACHED = object()
 
 class UserService:
-    def __init__(self, user_dao, config, s3_client):
-        self.user_dao   = user_dao
-        self.config     = config
-        self.s3         = s3_client
+    def __init__(self, user_dao, config, s3_client, timeline_dao=None, timeline_cache=None, password_hasher=None, storage=None, follow_graph=None):
+        self.user_dao       = user_dao
+        self.config         = config
+        self.s3             = s3_client
+        self.timeline_dao   = timeline_dao
+        self.timeline_cache = timeline_cache
+        self.follow_graph   = follow_graph
+        self.hasher         = password_hasher or PasswordHasher(config.get('BCRYPT_ROUNDS', 12))
+        self.storage        = storage or S3Storage(s3_client, config['S3_BUCKET'], config['S3_BUCKET_URL'])
+        self.picture_cache  = LRUCache(
+            config.get('PROFILE_PICTURE_CACHE_SIZE', 10000),
+            config.get('PROFILE_PICTURE_CACHE_TTL', 60)
+        )
+        self.uploader       = ProfilePictureUploader(
+            self.storage,
+            user_dao,
+            workers     = config.get('PROFILE_PICTURE_UPLOAD_WORKERS', 2),
+            on_complete = self.picture_cache.delete
+        ) if config.get('PROFILE_PICTURE_ASYNC') else None
 
 
     def create_new_user(self, new_user):
-        new_user['password']    = bcrypt.hashpw(new_user['password'].encode('utf-8'), bcrypt.gensalt())
+        new_user['password']    = self.hasher.hash(new_user['password'])
         new_user_id             = self.user_dao.insert_user(new_user)
 
         return new_user_id
@@ -22,14 +40,16 @@ class UserService:
         password            = credential['password']
         user_credential     = self.user_dao.get_user_id_and_password(email)
         
-        authorized      = user_credential and bcrypt.checkpw(password.encode('utf-8'), user_credential['hashed_password'].encode('utf-8'))
+        authorized      = user_credential and self.hasher.check(password, user_credential.hashed_password)
         
         if authorized:
-            return authorized, user_credential['id']
+            return authorized, user_credential.id
         else:
             return authorized, None
 
     def generate_access_token(self,user_id):
+        import jwt
+
         payload     = {
             'user_id'   : user_id,
             'exp'       : datetime.utcnow() + timedelta(seconds=60 * 60)
@@ -39,20 +59,98 @@ class UserService:
         return token.decode('utf-8')
 
     def follow(self, user_id, follow_id):
-        return self.user_dao.insert_follow(user_id, follow_id)
+        result = self.user_dao.insert_follow(user_id, follow_id)
+
+        if self.follow_graph:
+            self.follow_graph.follow(user_id, follow_id)
+
+        if self.timeline_dao:
+            self.timeline_dao.add_followee(user_id, follow_id)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
+
+        return result
 
     def unfollow(self, user_id, unfollow_id):
-        return self.user_dao.insert_unfollow(user_id, unfollow_id)
+        result = self.user_dao.insert_unfollow(user_id, unfollow_id)
+
+        if self.follow_graph:
+            self.follow_graph.unfollow(user_id, unfollow_id)
+
+        if self.timeline_dao:
+            self.timeline_dao.remove_followee(user_id, unfollow_id)
+
+        if self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
+
+        return result
+
+    def follows(self, user_id, follow_ids):
+        results     = self.user_dao.insert_follows(user_id, follow_ids)
+        followed    = [follow_id for follow_id, result in results.items() if result == 'followed']
+
+        for follow_id in followed:
+            if self.follow_graph:
+                self.follow_graph.follow(user_id, follow_id)
+            if self.timeline_dao:
+                self.timeline_dao.add_followee(user_id, follow_id)
+
+        if followed and self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
+
+        return results
+
+    def unfollows(self, user_id, unfollow_ids):
+        results     = self.user_dao.insert_unfollows(user_id, unfollow_ids)
+        unfollowed  = [unfollow_id for unfollow_id, result in results.items() if result == 'unfollowed']
+
+        for unfollow_id in unfollowed:
+            if self.follow_graph:
+                self.follow_graph.unfollow(user_id, unfollow_id)
+            if self.timeline_dao:
+                self.timeline_dao.remove_followee(user_id, unfollow_id)
+
+        if unfollowed and self.timeline_cache:
+            self.timeline_cache.invalidate(user_id)
+
+        return results
 
     def save_profile_picture(self, picture, filename, user_id):
-        self.s3.upload_fileobj(
-            picture,
-            self.config['S3_BUCKET'],
-            filename
-        )
-        image_url = f"{self.config['S3_BUCKET_URL']}{filename}"
+        image_url   = self.storage.upload(picture, filename)
+        result      = self.user_dao.save_profile_picture(image_url, user_id)
+        self.picture_cache.delete(user_id)
+
+        return result
 
-        return self.user_dao.save_profile_picture(image_url, user_id)
+    def upload_profile_picture(self, picture, filename, user_id):
+        if self.uploader is None:
+            self.save_profile_picture(picture, filename, user_id)
+            return None
+
+        return self.uploader.submit(picture, filename, user_id)
+
+    def get_profile_picture_upload(self, upload_id):
+        return self.user_dao.get_profile_picture_upload(upload_id)
 
     def get_profile_picture(self, user_id):
         return self.user_dao.get_profile_picture(user_id)
+
+    def get_profile_pictures(self, user_ids):
+        pictures    = {}
+        missing     = []
+
+        for user_id in set(user_ids):
+            picture = self.picture_cache.get(user_id, NOT_CACHED)
+            if picture is NOT_CACHED:
+                missing.append(user_id)
+            else:
+                pictures[user_id] = picture
+
+        if missing:
+            found = self.user_dao.get_profile_pictures(missing)
+            for user_id in missing:
+                pictures[user_id] = found.get(user_id)
+                self.picture_cache.set(user_id, pictures[user_id])
+
+        return pictures
@@ -5,7 +5,12 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 import config
 
-from model      import UserDao, TweetDao
+from model      import UserDao, TweetDao, TimelineDao, Tweet, EngineRouter
+from model.statements import create_compiled_cache
+from model.tweet_dao import merge_timelines
+from model.migrations import migrate
+from model.plan_check import full_scans
+from benchmark.seed import reset_tables, seed_social_graph
 from sqlalchemy import create_engine, text
 
 database = create_engine(config.test_config['DB_URL'], encoding='utf-8', max_overflow=0)
@@ -18,6 +23,10 @@ def user_dao():
 def tweet_dao():
     return TweetDao(database)
 
+@pytest.fixture
+def timeline_dao():
+    return TimelineDao(database)
+
 def setup_function():
     hashed_password = bcrypt.hashpw(b'pw', bcrypt.gensalt())
     new_users = [
@@ -67,6 +76,7 @@ def teardown_function():
     database.execute(text("truncate users"))
     database.execute(text("truncate users_follow_list"))
     database.execute(text("truncate tweets"))
+    database.execute(text("truncate users_timeline"))
     database.execute(text('set foreign_key_checks=1'))
 
 def get_user(user_id):
@@ -120,8 +130,8 @@ def test_get_id_and_password(user_dao):
     
     user_credential = user_dao.get_user_id_and_password(email='messi@')
     
-    assert user_credential['id'] == 1
-    assert bcrypt.checkpw('pw'.encode('utf-8'), user_credential['hashed_password'].encode('utf-8'))
+    assert user_credential.id == 1
+    assert bcrypt.checkpw('pw'.encode('utf-8'), user_credential.hashed_password.encode('utf-8'))
 
 def test_insert_follow(user_dao):
     
@@ -144,12 +154,26 @@ def test_insert_tweet(tweet_dao):
     tweet_dao.insert_tweet(1,'hi naldo')
     timeline = tweet_dao.get_timeline(1)
 
-    assert timeline == [
-        {
-            'user_id'   : 1,
-            'tweet'     : 'hi naldo'
-        }
-    ]
+    assert timeline == [Tweet(2, 1, 'hi naldo')]
+
+def test_insert_tweets(tweet_dao):
+    rowcount = tweet_dao.insert_tweets(1, ['one', 'two', 'three'], chunk_size=2)
+
+    assert rowcount == 3
+    assert tweet_dao.get_last_tweet_id(1) == 4
+    assert [tweet.tweet for tweet in tweet_dao.get_timeline(1)] == ['three', 'two', 'one']
+
+def test_compiled_statement_cache():
+    cache       = create_compiled_cache()
+    tweet_dao   = TweetDao(database.execution_options(compiled_cache=cache))
+
+    tweet_dao.insert_tweet(1, 'hi naldo')
+    tweet_dao.insert_tweet(1, 'bye naldo')
+    tweet_dao.get_timeline(1)
+    tweet_dao.get_timeline(1)
+
+    assert len(cache) == 2
+    assert [tweet.tweet for tweet in tweet_dao.get_timeline(1)] == ['bye naldo', 'hi naldo']
 
 def test_timeline(user_dao, tweet_dao):
     tweet_dao.insert_tweet(1, 'hi naldo')
@@ -159,20 +183,147 @@ def test_timeline(user_dao, tweet_dao):
     timeline = tweet_dao.get_timeline(1)
 
     assert timeline == [
-        {
-            'user_id'   : 2,
-            'tweet'     : 'hi messi'
-        },
-        {
-            'user_id'   : 1,
-            'tweet'     : 'hi naldo'
-        },
-        {
-            'user_id'   : 2,
-            'tweet'     : 'bye messi'
-        }
+        Tweet(3, 2, 'bye messi'),
+        Tweet(2, 1, 'hi naldo'),
+        Tweet(1, 2, 'hi messi')
+    ]
+
+def test_timeline_self_follow(user_dao, tweet_dao):
+    tweet_dao.insert_tweet(2, 'bye messi')
+    user_dao.insert_follow(2, 2)
+
+    assert tweet_dao.get_timeline(2) == [
+        Tweet(2, 2, 'bye messi'),
+        Tweet(1, 2, 'hi messi')
+    ]
+    assert list(tweet_dao.iter_timeline(2)) == tweet_dao.get_timeline(2)
+
+def test_merge_timelines():
+    runs = [
+        [Tweet(9, 1, 'a'), Tweet(5, 1, 'b'), Tweet(1, 1, 'c')],
+        [Tweet(8, 2, 'd'), Tweet(5, 1, 'b'), Tweet(2, 2, 'e')],
+        []
+    ]
+
+    assert [tweet.id for tweet in merge_timelines(runs, 4)] == [9, 8, 5, 2]
+    assert [tweet.id for tweet in merge_timelines(runs, 10)] == [9, 8, 5, 2, 1]
+
+def test_merged_timeline(user_dao, tweet_dao):
+    tweet_dao.insert_tweet(1, 'hi naldo')
+    tweet_dao.insert_tweet(2, 'bye messi')
+    user_dao.insert_follow(1, 2)
+
+    assert tweet_dao.get_merged_timeline(1) == tweet_dao.get_timeline(1)
+    assert tweet_dao.get_merged_timeline(1, before=3, limit=1) == [Tweet(2, 1, 'hi naldo')]
+
+def test_timeline_pagination(user_dao, tweet_dao):
+    tweet_dao.insert_tweet(1, 'hi naldo')
+    tweet_dao.insert_tweet(2, 'bye messi')
+    user_dao.insert_follow(1,2)
+
+    timeline = tweet_dao.get_timeline(1, limit=2)
+    assert [tweet.id for tweet in timeline] == [3, 2]
+
+    timeline = tweet_dao.get_timeline(1, before=2, limit=2)
+    assert [tweet.id for tweet in timeline] == [1]
+
+def test_fanout_timeline(user_dao, tweet_dao, timeline_dao):
+    user_dao.insert_follow(1, 2)
+    timeline_dao.add_followee(1, 2)
+
+    tweet_id = tweet_dao.insert_tweet(2, 'bye messi')
+    timeline_dao.push_tweet(2, tweet_id)
+
+    assert timeline_dao.get_timeline(1) == [
+        Tweet(2, 2, 'bye messi'),
+        Tweet(1, 2, 'hi messi')
+    ]
+
+    user_dao.insert_unfollow(1, 2)
+    timeline_dao.remove_followee(1, 2)
+
+    assert timeline_dao.get_timeline(1) == []
+
+def test_rebuild_timeline(user_dao, tweet_dao, timeline_dao):
+    tweet_dao.insert_tweet(1, 'hi naldo')
+    user_dao.insert_follow(1, 2)
+
+    timeline_dao.rebuild(1)
+
+    assert timeline_dao.get_timeline(1) == [
+        Tweet(2, 1, 'hi naldo'),
+        Tweet(1, 2, 'hi messi')
     ]
 
+def test_timeline_max_length(user_dao, tweet_dao):
+    timeline_dao = TimelineDao(database, max_length=2)
+    tweet_dao.insert_tweets(2, ['one', 'two'])
+    user_dao.insert_follow(1, 2)
+
+    timeline_dao.add_followee(1, 2)
+    assert [tweet.id for tweet in timeline_dao.get_timeline(1)] == [3, 2]
+
+    tweet_id = tweet_dao.insert_tweet(2, 'three')
+    timeline_dao.push_tweet(2, tweet_id)
+    assert [tweet.id for tweet in timeline_dao.get_timeline(1)] == [4, 3]
+    assert [tweet.id for tweet in timeline_dao.get_timeline(2)] == [4]
+
+@pytest.mark.skipif('REPLICA_DB_URL' not in config.test_config, reason='needs a second local database')
+def test_replica_routing():
+    replica     = create_engine(config.test_config['REPLICA_DB_URL'], encoding='utf-8', max_overflow=0)
+    router      = EngineRouter(database, [replica], read_your_writes=60)
+    tweet_dao   = TweetDao(router)
+
+    assert router.reader(1) is replica
+
+    tweet_dao.insert_tweet(1, 'hi naldo')
+
+    assert router.reader(1) is database
+    assert router.reader(2) is replica
+    assert tweet_dao.get_timeline(1) == [Tweet(2, 1, 'hi naldo')]
+
+    user_dao = UserDao(router)
+    user_dao.save_profile_picture('http://localhost/1.jpg', 1)
+    assert user_dao.get_profile_pictures([1]) == {1 : 'http://localhost/1.jpg'}
+
+    user_dao.insert_follow(1, 2)
+    assert list(user_dao.iter_follow_edges()) == [(1, 2)]
+
+    router.recent_writes.clear()
+    assert router.reader(1) is replica
+
+    least_busy = EngineRouter(database, [replica, database], strategy='least_busy')
+    with replica.connect():
+        assert least_busy.reader() is database
+
+def test_insert_follows(user_dao):
+    user_dao.insert_follow(user_id=1, follow_id=2)
+
+    assert user_dao.insert_follows(1, [2, 1, 3, 2]) == {
+        2   : 'already_following',
+        1   : 'self',
+        3   : 'not_found'
+    }
+    assert get_follow_list(1) == [2]
+
+    assert user_dao.insert_follows(2, [1]) == {1 : 'followed'}
+    assert get_follow_list(2) == [1]
+
+    assert user_dao.insert_unfollows(1, [1, 2, 3]) == {
+        1   : 'not_following',
+        2   : 'unfollowed',
+        3   : 'not_following'
+    }
+    assert get_follow_list(1) == []
+
+def test_get_profile_pictures(user_dao):
+    user_dao.save_profile_picture('http://localhost/1.jpg', 1)
+
+    assert user_dao.get_profile_pictures([1, 2, 3]) == {
+        1   : 'http://localhost/1.jpg',
+        2   : None
+    }
+
 def test_save_and_get_profile_picture(user_dao):
     user_id = 2
     user_profile_picture = user_dao.get_profile_picture(user_id)
@@ -184,3 +335,16 @@ def test_save_and_get_profile_picture(user_dao):
     actural_profile_picture = user_dao.get_profile_picture(user_id)
 
     assert expected_profile_picture == actural_profile_picture
+
+def test_migrate():
+    migrate(database)
+
+    assert migrate(database) == []
+
+def test_query_plans():
+    migrate(database)
+    reset_tables(database)
+    seed_social_graph(database, users=200, mean_follows=10, mean_tweets=10)
+    database.execute(text("analyze table users, tweets, users_follow_list, users_timeline, profile_picture_uploads"))
+
+    assert full_scans(database) == []
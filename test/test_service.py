@@ -1,13 +1,26 @@
 import jwt
 import bcrypt
 import pytest
+import io
+import time
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 import config
 
-from model      import UserDao, TweetDao
-from service    import UserService, TweetService
+from model      import UserDao, TweetDao, TimelineDao, Tweet
+from service    import (
+    UserService,
+    TweetService,
+    LRUCache,
+    LocalTimelineCache,
+    RemoteTimelineCache,
+    PasswordHasher,
+    PasswordHasherBusy,
+    LocalStorage,
+    FollowGraph,
+    TweetBufferFull
+)
 from sqlalchemy import create_engine, text
 from unittest   import mock
 
@@ -23,6 +36,43 @@ def user_service():
 def tweet_service():
     return TweetService(TweetDao(database))
 
+class FakeCacheClient:
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ttl):
+        self.store[key] = value
+
+    def incr(self, key):
+        self.store[key] = int(self.store.get(key, 0)) + 1
+        return self.store[key]
+
+@pytest.fixture(params=['local', 'remote'])
+def cached_services(request):
+    if request.param == 'local':
+        timeline_cache = LocalTimelineCache(maxsize=100, ttl=60)
+    else:
+        timeline_cache = RemoteTimelineCache(FakeCacheClient(), ttl=60)
+    user_dao = UserDao(database)
+
+    return (
+        UserService(user_dao, config.test_config, mock.Mock(), timeline_cache=timeline_cache),
+        TweetService(TweetDao(database), user_dao=user_dao, timeline_cache=timeline_cache),
+        timeline_cache
+    )
+
+@pytest.fixture
+def fanout_services():
+    timeline_dao = TimelineDao(database)
+
+    return (
+        UserService(UserDao(database), config.test_config, mock.Mock(), timeline_dao),
+        TweetService(TweetDao(database), timeline_dao)
+    )
+
 def setup_function():
     hashed_password = bcrypt.hashpw('pw'.encode('utf-8'), bcrypt.gensalt())
 
@@ -74,6 +124,8 @@ def teardown_function():
     database.execute(text("truncate users"))
     database.execute(text("truncate tweets"))
     database.execute(text("truncate users_follow_list"))
+    database.execute(text("truncate users_timeline"))
+    database.execute(text("truncate profile_picture_uploads"))
     database.execute(text("set foreign_key_checks=1"))
 
 def get_user(user_id):
@@ -134,6 +186,26 @@ def test_login(user_service):
         'password'  : 'fake'
     })
     
+def test_password_hasher():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    hashed_password = hasher.hash('pw')
+
+    assert hasher.check('pw', hashed_password.decode('utf-8'))
+    assert not hasher.check('fake', hashed_password.decode('utf-8'))
+
+    hasher.slots.acquire()
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('pw')
+
+    hasher.slots.release()
+    hasher.shutdown()
+
+    slow_hasher = PasswordHasher(rounds=14, workers=1, timeout=0.01)
+    with pytest.raises(PasswordHasherBusy):
+        slow_hasher.hash('pw')
+
+    slow_hasher.shutdown()
+
 def test_generate_access_token(user_service):
     token = user_service.generate_access_token(1)
     payload = jwt.decode(token, config.JWT_SECRET_KEY, 'HS256')
@@ -155,33 +227,230 @@ def test_unfollow(user_service):
 
 def test_tweet(tweet_service):
     tweet_service.tweet(1, 'hi lee')
-    timeline = tweet_service.timeline(1)
+    timeline, next_cursor = tweet_service.timeline(1)
     
-    assert timeline == [{
-        'user_id'   : 1,
-        'tweet'     : 'hi lee'
-    }]
+    assert timeline == [Tweet(2, 1, 'hi lee')]
+    assert next_cursor is None
 
 def test_timeline(tweet_service, user_service):
     tweet_service.tweet(1, 'hi lee')
     tweet_service.tweet(2, 'bye kim')
     user_service.follow(1,2)
-    timeline    = tweet_service.timeline(1)
+    timeline, next_cursor = tweet_service.timeline(1)
 
     assert timeline == [
-        {
-            'user_id'   : 2,
-            'tweet'     : 'hi kim'
-        },
-        {
-            'user_id'   : 1,
-            'tweet'     : 'hi lee'
-        },
-        {
-            'user_id'   : 2,
-            'tweet'     : 'bye kim'
-        }
+        Tweet(3, 2, 'bye kim'),
+        Tweet(2, 1, 'hi lee'),
+        Tweet(1, 2, 'hi kim')
     ]
+    assert next_cursor is None
+
+def test_timeline_cursor(tweet_service, user_service):
+    tweet_service.tweet(1, 'hi lee')
+    tweet_service.tweet(2, 'bye kim')
+    user_service.follow(1,2)
+
+    timeline, next_cursor = tweet_service.timeline(1, limit=2)
+    assert [tweet.id for tweet in timeline] == [3, 2]
+    assert next_cursor == 2
+
+    timeline, next_cursor = tweet_service.timeline(1, before=next_cursor, limit=2)
+    assert [tweet.id for tweet in timeline] == [1]
+    assert next_cursor is None
+
+def test_fanout_timeline(fanout_services):
+    user_service, tweet_service = fanout_services
+
+    tweet_service.tweet(1, 'hi lee')
+    user_service.follow(1, 2)
+    tweet_service.tweet(2, 'bye kim')
+
+    timeline, _ = tweet_service.timeline(1)
+    assert timeline == [
+        Tweet(3, 2, 'bye kim'),
+        Tweet(2, 1, 'hi lee'),
+        Tweet(1, 2, 'hi kim')
+    ]
+
+    user_service.unfollow(1, 2)
+
+    timeline, _ = tweet_service.timeline(1)
+    assert timeline == [Tweet(2, 1, 'hi lee')]
+
+def test_write_behind_tweet(fanout_services):
+    user_service, tweet_service = fanout_services
+    user_service.follow(1, 2)
+    write_buffer = tweet_service.enable_write_behind(batch_size=2, flush_interval=0.01, ack='flushed')
+
+    tweet_service.tweet(2, 'bye kim')
+    tweet_service.tweet(1, 'hi lee')
+    write_buffer.close()
+
+    timeline, _ = tweet_service.timeline(1)
+    assert timeline == [
+        Tweet(3, 1, 'hi lee'),
+        Tweet(2, 2, 'bye kim'),
+        Tweet(1, 2, 'hi kim')
+    ]
+
+def test_write_behind_buffer_full():
+    tweet_service   = TweetService(mock.Mock())
+    write_buffer    = tweet_service.enable_write_behind(max_size=0)
+
+    with pytest.raises(TweetBufferFull):
+        tweet_service.tweet(1, 'hi lee')
+
+    write_buffer.close()
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.stats() == {
+        'hits'      : 2,
+        'misses'    : 1,
+        'evictions' : 1,
+        'size'      : 2
+    }
+
+    cache.set('d', 4, ttl=-1)
+    assert cache.get('d') is None
+
+def test_timeline_cache_versions_bounded():
+    timeline_cache = LocalTimelineCache(maxsize=10, ttl=60, versions_maxsize=2)
+    stale_key = timeline_cache.key(1, None, 20)
+    timeline_cache.set(stale_key, ([], None))
+
+    timeline_cache.invalidate(1)
+    timeline_cache.invalidate(2)
+    timeline_cache.invalidate(3)
+
+    assert len(timeline_cache.versions) == 2
+    assert timeline_cache.key(1, None, 20) != stale_key
+    assert timeline_cache.get(timeline_cache.key(1, None, 20)) is None
+
+    expired_cache = LocalTimelineCache(maxsize=10, ttl=-1)
+    expired_cache.invalidate(1)
+    expired_cache.invalidate(2)
+
+    assert len(expired_cache.versions) == 0
+
+def test_timeline_cache_invalidation_during_read(cached_services):
+    _, _, timeline_cache = cached_services
+
+    cache_key = timeline_cache.key(1, None, 20)
+    assert timeline_cache.get(cache_key) is None
+
+    timeline_cache.invalidate(1)
+    timeline_cache.set(cache_key, ([Tweet(1, 2, 'hi kim')], None))
+
+    assert timeline_cache.get(timeline_cache.key(1, None, 20)) is None
+
+def test_timeline_version_cache(cached_services):
+    user_service, tweet_service, timeline_cache = cached_services
+
+    etag, _ = tweet_service.timeline_version(1, None, None)
+    with mock.patch.object(tweet_service.tweet_dao, 'get_timeline_version') as get_timeline_version:
+        assert tweet_service.timeline_version(1, None, None)[0] == etag
+        get_timeline_version.assert_not_called()
+
+    user_service.follow(1, 2)
+    assert tweet_service.timeline_version(1, None, None)[0] != etag
+
+def test_timeline_cache_invalidation(cached_services):
+    user_service, tweet_service, timeline_cache = cached_services
+    user_service.follow(1, 2)
+
+    timeline, _ = tweet_service.timeline(1)
+    assert [tweet.id for tweet in timeline] == [1]
+    assert timeline_cache.stats()['misses'] == 1
+
+    tweet_service.timeline(1)
+    assert timeline_cache.stats()['hits'] == 1
+
+    tweet_service.tweet(2, 'bye kim')
+    timeline, _ = tweet_service.timeline(1)
+    assert [tweet.id for tweet in timeline] == [2, 1]
+
+    user_service.unfollow(1, 2)
+    timeline, _ = tweet_service.timeline(1)
+    assert timeline == []
+
+def test_follow_graph():
+    follow_graph = FollowGraph()
+    assert follow_graph.load([(1, 3), (1, 2), (1, 2), (2, 1)]) == 3
+
+    assert list(follow_graph.get_followees(1)) == [2, 3]
+    assert list(follow_graph.get_followers(2)) == [1]
+
+    assert not follow_graph.follow(1, 2)
+    assert follow_graph.follow(3, 2)
+    assert list(follow_graph.get_followers(2)) == [1, 3]
+
+    assert follow_graph.unfollow(1, 2)
+    assert not follow_graph.is_following(1, 2)
+    assert list(follow_graph.get_followers(2)) == [3]
+    assert follow_graph.edges == 3
+
+def test_follow_graph_reload():
+    follow_graph    = FollowGraph()
+    follow_graph.load([(1, 2)])
+    edges           = [(1, 2), (1, 3)]
+
+    def load_edges():
+        follow_graph.follow(1, 4)
+        yield from edges
+
+    follow_graph.load(load_edges())
+    assert list(follow_graph.get_followees(1)) == [2, 3, 4]
+
+    edges.remove((1, 2))
+    follow_graph.start_reloading(lambda: iter(edges), 0.01)
+    time.sleep(0.1)
+    follow_graph.stop_reloading()
+
+    assert list(follow_graph.get_followees(1)) == [3]
+
+def test_follow_graph_timeline():
+    user_dao        = UserDao(database)
+    follow_graph    = FollowGraph()
+    follow_graph.load(user_dao.iter_follow_edges())
+
+    user_service    = UserService(user_dao, config.test_config, mock.Mock(), follow_graph=follow_graph)
+    tweet_service   = TweetService(TweetDao(database), user_dao=user_dao, follow_graph=follow_graph)
+
+    tweet_service.tweet(1, 'hi lee')
+    user_service.follow(1, 2)
+    assert list(follow_graph.get_followers(2)) == [1]
+
+    timeline, _ = tweet_service.timeline(1)
+    assert timeline == [
+        Tweet(2, 1, 'hi lee'),
+        Tweet(1, 2, 'hi kim')
+    ]
+
+    user_service.unfollow(1, 2)
+    timeline, _ = tweet_service.timeline(1)
+    assert timeline == [Tweet(2, 1, 'hi lee')]
+
+def test_get_profile_pictures(user_service):
+    user_service.user_dao = mock.Mock(wraps=user_service.user_dao)
+
+    assert user_service.get_profile_pictures([1, 2, 3]) == {1 : None, 2 : None, 3 : None}
+    assert user_service.get_profile_pictures([1, 2]) == {1 : None, 2 : None}
+    assert user_service.user_dao.get_profile_pictures.call_count == 1
+
+    user_service.save_profile_picture(mock.Mock(), 'test.png', 1)
+    assert user_service.get_profile_pictures([1, 2]) == {
+        1   : 'http://s3.ap-northeast-2.amazonaws.com/test/test.png',
+        2   : None
+    }
+    assert user_service.user_dao.get_profile_pictures.call_count == 2
 
 def test_save_and_get_profile_picture(user_service):
     user_id = 1
@@ -194,3 +463,54 @@ def test_save_and_get_profile_picture(user_service):
 
     actual_profile_picture = user_service.get_profile_picture(user_id)
     assert actual_profile_picture == 'http://s3.ap-northeast-2.amazonaws.com/test/test.png'
+
+def test_async_profile_picture_upload(tmp_path):
+    user_service = UserService(
+        UserDao(database),
+        dict(config.test_config, PROFILE_PICTURE_ASYNC=True),
+        None,
+        storage = LocalStorage(str(tmp_path), 'http://localhost/')
+    )
+
+    upload_id = user_service.upload_profile_picture(io.BytesIO(b'test image'), 'test.png', 1)
+    user_service.uploader.shutdown()
+
+    assert user_service.get_profile_picture_upload(upload_id) == {
+        'id'        : upload_id,
+        'user_id'   : 1,
+        'status'    : 'done',
+        'url'       : 'http://localhost/test.png'
+    }
+    assert user_service.get_profile_picture(1) == 'http://localhost/test.png'
+    assert (tmp_path / 'test.png').read_bytes() == b'test image'
+
+def test_failed_profile_picture_upload():
+    storage = mock.Mock()
+    storage.upload.side_effect = IOError()
+    user_service = UserService(
+        UserDao(database),
+        dict(config.test_config, PROFILE_PICTURE_ASYNC=True),
+        None,
+        storage = storage
+    )
+
+    upload_id = user_service.upload_profile_picture(io.BytesIO(b'test image'), 'test.png', 1)
+    user_service.uploader.shutdown()
+
+    assert user_service.get_profile_picture_upload(upload_id)['status'] == 'failed'
+    assert user_service.get_profile_picture(1) is None
+
+def test_failed_profile_picture_completion(tmp_path):
+    user_service = UserService(
+        UserDao(database),
+        dict(config.test_config, PROFILE_PICTURE_ASYNC=True),
+        None,
+        storage = LocalStorage(str(tmp_path), 'http://localhost/')
+    )
+
+    with mock.patch.object(user_service.user_dao, 'complete_profile_picture_upload', side_effect=IOError()):
+        upload_id = user_service.upload_profile_picture(io.BytesIO(b'test image'), 'test.png', 1)
+        user_service.uploader.shutdown()
+
+    assert user_service.get_profile_picture_upload(upload_id)['status'] == 'failed'
+    assert user_service.get_profile_picture(1) is None
@@ -6,17 +6,21 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 import config
 import json
 import io
+import datetime
 
 from app        import create_app
+from view.serializer import create_serializer, available_serializers
+from view.admission  import AdmissionController, AdmissionRejected
+from metrics    import Registry, instrument_dao
 from sqlalchemy import create_engine, text
 from unittest   import mock
 
 database = create_engine(config.test_config['DB_URL'], encoding='utf-8', max_overflow=0)
 
 @pytest.fixture
-@mock.patch('app.boto3')
-def api(mock_boto3):
-    mock_boto3.client.return_value = mock.Mock()
+@mock.patch('app.create_s3_client')
+def api(mock_create_s3_client):
+    mock_create_s3_client.return_value = mock.Mock()
     
     app = create_app(config.test_config)
     app.config['TEST']  = True
@@ -76,10 +80,81 @@ def teardown_function():
     database.execute(text("truncate users_follow_list"))
     database.execute(text("set foreign_key_checks=1"))
 
+def test_serializer():
+    for name in available_serializers():
+        serializer = create_serializer(name)
+        payload    = serializer.dumps({
+            'ids'   : {1},
+            'date'  : datetime.date(2020, 8, 1),
+            'tweet' : '안녕'
+        })
+
+        assert json.loads(payload.decode('utf-8')) == {
+            'ids'   : [1],
+            'date'  : '2020-08-01',
+            'tweet' : '안녕'
+        }
+
 def test_ping(api):
     resp    = api.get('/ping')
     assert b'pong' in resp.data
 
+def test_db_pool(api):
+    api.get('/ping')
+    resp    = api.get('/db-pool')
+    stats   = json.loads(resp.data.decode('utf-8'))
+
+    assert resp.status_code == 200
+    assert stats['size'] == config.test_config.get('DB_POOL_SIZE', 5)
+    assert stats['checkout_failures'] == 0
+    assert stats['wait_time']['buckets'][-1][0] == '+Inf'
+
+def test_metrics(api):
+    api.get('/timeline/1')
+    resp    = api.get('/metrics')
+    body    = resp.data.decode('utf-8')
+
+    assert resp.status_code == 200
+    assert 'http_requests_total{endpoint="timeilne",method="GET",status="200"} 1' in body
+    assert 'dao_query_seconds_count{dao="TweetDao",method="get_timeline"} 1' in body
+    assert 'db_pool_checked_out' in body
+
+    api.get('/timeline/2?stream=1')
+    body    = api.get('/metrics').data.decode('utf-8')
+
+    assert 'dao_rows_total{dao="TweetDao",method="iter_timeline"} 1' in body
+
+def test_dao_rows_metric():
+    class FakeDao:
+        keyed_reads = ('get_pictures',)
+
+        def get_version(self):
+            return {'latest_id' : 1, 'follows' : 0, 'follow_hash' : 0, 'latest_at' : None}
+
+        def get_last_id(self):
+            return 0
+
+        def get_pictures(self):
+            return {1 : 'a', 2 : 'b', 3 : None}
+
+        def get_rows(self):
+            return [1, 2]
+
+        def insert_rows(self):
+            return 7
+
+    registry    = Registry()
+    dao         = instrument_dao(FakeDao(), registry)
+    for name in ('get_version', 'get_last_id', 'get_pictures', 'get_rows', 'insert_rows'):
+        getattr(dao, name)()
+    body        = registry.exposition()
+
+    assert 'dao_rows_total{dao="FakeDao",method="get_version"} 1' in body
+    assert 'dao_rows_total{dao="FakeDao",method="get_last_id"} 1' in body
+    assert 'dao_rows_total{dao="FakeDao",method="get_pictures"} 3' in body
+    assert 'dao_rows_total{dao="FakeDao",method="get_rows"} 2' in body
+    assert 'dao_rows_total{dao="FakeDao",method="insert_rows"} 0' in body
+
 def test_login(api):
     resp    = api.post(
         '/login',
@@ -113,6 +188,29 @@ def test_unauthorized(api):
     )
     assert resp.status_code == 401
 
+def test_token_cache(api):
+    resp = api.post(
+        '/login',
+        data            = json.dumps({
+            'email'     : 'messi@',
+            'password'  : 'pw'
+        }),
+        content_type    = 'application/json'
+    )
+    access_token    = resp.json['access_token']
+    token_cache     = api.application.extensions['token_cache']
+
+    resp = api.get('/timeline', headers = {'Authorization'  : access_token})
+    assert resp.status_code == 200
+    resp = api.get('/timeline', headers = {'Authorization'  : access_token})
+    assert resp.status_code == 200
+    assert token_cache.cache.stats()['hits'] == 1
+
+    api.application.config['JWT_SECRET_KEY'] = 'rotated'
+    resp = api.get('/timeline', headers = {'Authorization'  : access_token})
+    assert resp.status_code == 401
+    assert token_cache.cache.stats()['size'] == 0
+
 def test_tweet(api):
     resp = api.post(
         '/login',
@@ -141,12 +239,43 @@ def test_tweet(api):
         'user_id'       : 1,
         'timeline'      : [
             {
+                'id'        : 2,
                 'user_id'   : 1,
                 'tweet'     : 'hi naldo'
             }
+        ],
+        'next_cursor'   : None
+    }
+
+def test_bulk_tweet(api):
+    resp = api.post(
+        '/login',
+        data            = json.dumps({
+            'email'     : 'messi@',
+            'password'  : 'pw'
+        }),
+        content_type    = 'application/json'
+    )
+    access_token    = resp.json['access_token']
+
+    resp = api.post(
+        '/tweets',
+        data            = json.dumps({'tweets' : ['hi naldo', 'a' * 301, 'bye naldo']}),
+        content_type    = 'application/json',
+        headers         = {'Authorization'  : access_token}
+    )
+    assert resp.status_code == 200
+    assert resp.json == {
+        'results'   : [
+            {'index' : 0, 'status' : 'created'},
+            {'index' : 1, 'status' : 'too_long'},
+            {'index' : 2, 'status' : 'created'}
         ]
     }
 
+    resp = api.get('/timeline', headers = {'Authorization'  : access_token})
+    assert [tweet['tweet'] for tweet in resp.json['timeline']] == ['bye naldo', 'hi naldo']
+
 def test_follow(api):
     resp = api.post(
         '/login',
@@ -166,8 +295,9 @@ def test_follow(api):
     timeline    = json.loads(resp.data.decode('utf-8'))
     assert resp.status_code == 200
     assert timeline == {
-        'user_id'   : 1,
-        'timeline'  : []
+        'user_id'       : 1,
+        'timeline'      : [],
+        'next_cursor'   : None
     }
 
     resp = api.post(
@@ -192,10 +322,12 @@ def test_follow(api):
         'user_id'   : 1,
         'timeline'  : [
             {
+                'id'        : 1,
                 'user_id'   : 2,
                 'tweet'     : 'hi messi'
             }
-        ]
+        ],
+        'next_cursor'   : None
     }
 
 
@@ -230,10 +362,12 @@ def test_unfollow(api):
         'user_id'       : 1,
         'timeline'      : [
             {
+                'id'            : 1,
                 'user_id'       : 2,
                 'tweet'         : 'hi messi'
             }
-        ]
+        ],
+        'next_cursor'   : None
     }
 
     resp = api.post(
@@ -251,10 +385,104 @@ def test_unfollow(api):
     timeline    = json.loads(resp.data.decode('utf-8'))
     assert resp.status_code == 200
     assert timeline         == {
-        'user_id'   : 1,
-        'timeline'  : []
+        'user_id'       : 1,
+        'timeline'      : [],
+        'next_cursor'   : None
     }
 
+def test_stream_timeline(api):
+    resp = api.post(
+        '/login',
+        data            = json.dumps({
+            'email'     : 'naldo@',
+            'password'  : 'pw'
+        }),
+        content_type    = 'application/json'
+    )
+    access_token    = resp.json['access_token']
+
+    api.post(
+        '/tweets',
+        data            = json.dumps({'tweets' : [f"tweet {n}" for n in range(250)]}),
+        content_type    = 'application/json',
+        headers         = {'Authorization'  : access_token}
+    )
+
+    resp        = api.get('/timeline/2?stream=1')
+    assert resp.is_streamed
+
+    timeline    = json.loads(resp.data.decode('utf-8'))
+    assert resp.status_code == 200
+    assert len(timeline['timeline']) == 251
+    assert timeline['timeline'][0] == {'id' : 251, 'user_id' : 2, 'tweet' : 'tweet 249'}
+    assert timeline['next_cursor'] is None
+
+    resp        = api.get('/timeline/2?stream=1&limit=10')
+    timeline    = json.loads(resp.data.decode('utf-8'))
+
+    assert len(timeline['timeline']) == 10
+    assert timeline['next_cursor'] == 242
+
+    resp        = api.get('/timeline/2?stream=1&limit=251')
+    timeline    = json.loads(resp.data.decode('utf-8'))
+
+    assert len(timeline['timeline']) == 251
+    assert timeline['next_cursor'] is None
+
+def test_timeline_etag(api):
+    resp = api.get('/timeline/2')
+    etag = resp.headers['ETag']
+
+    assert resp.status_code == 200
+    assert resp.headers['Last-Modified']
+
+    resp = api.get('/timeline/2', headers = {'If-None-Match' : etag})
+    assert resp.status_code == 304
+    assert resp.data == b''
+
+    resp = api.get('/timeline/2?limit=1', headers = {'If-None-Match' : etag})
+    assert resp.status_code == 200
+
+    resp = api.post(
+        '/login',
+        data            = json.dumps({
+            'email'     : 'messi@',
+            'password'  : 'pw'
+        }),
+        content_type    = 'application/json'
+    )
+    access_token = resp.json['access_token']
+
+    api.post(
+        '/follow',
+        data            = json.dumps({'follow' : 2}),
+        content_type    = 'application/json',
+        headers         = {'Authorization'  : access_token}
+    )
+    resp = api.get('/timeline', headers = {'Authorization' : access_token})
+    etag = resp.headers['ETag']
+
+    api.post(
+        '/tweet',
+        data            = json.dumps({'tweet' : 'hi naldo'}),
+        content_type    = 'application/json',
+        headers         = {'Authorization'  : access_token}
+    )
+    resp = api.get('/timeline', headers = {'Authorization' : access_token, 'If-None-Match' : etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+
+def test_get_profile_pictures(api):
+    resp = api.get('/profile-pictures?ids=1,2')
+    assert resp.status_code == 200
+    assert resp.json == {'profile_pictures' : {'1' : None, '2' : None}}
+
+    resp = api.get('/profile-pictures?ids=a')
+    assert resp.status_code == 400
+
+    resp = api.get('/timeline/2?with_pictures=1')
+    assert resp.json['profile_pictures'] == {'2' : None}
+
 def test_save_and_get_profile_picture(api):
     resp = api.post(
         '/login',
@@ -280,3 +508,138 @@ def test_save_and_get_profile_picture(api):
     data = json.loads(resp.data.decode('utf-8'))
 
     assert data['img_url'] == f"{config.test_config['S3_BUCKET_URL']}profile.png"
+
+    resp = api.get('/profile-picture/1', headers = {'If-None-Match' : resp.headers['ETag']})
+    assert resp.status_code == 304
+
+def test_admission_controller():
+    admission = AdmissionController(initial_limit=4, latency_target=60)
+
+    assert admission.acquire('ping') is None
+
+    tickets = [admission.acquire('timeilne') for _ in range(2)]
+    with pytest.raises(AdmissionRejected):
+        admission.acquire('bulk_tweet')
+
+    tickets += [admission.acquire('timeilne') for _ in range(2)]
+    with pytest.raises(AdmissionRejected):
+        admission.acquire('timeilne')
+
+    tickets += [admission.acquire('login') for _ in range(2)]
+    with pytest.raises(AdmissionRejected):
+        admission.acquire('login')
+
+    for ticket in tickets:
+        admission.release(ticket, failed=True)
+
+    assert admission.limit < 4
+    assert admission.stats()['inflight'] == 0
+
+    budgeted = AdmissionController(budgets={'login' : 1})
+    ticket   = budgeted.acquire('login')
+    with pytest.raises(AdmissionRejected):
+        budgeted.acquire('login')
+    budgeted.release(ticket)
+
+@mock.patch('app.create_s3_client')
+def test_admission_rejects_over_budget(mock_create_s3_client):
+    app = create_app(dict(
+        config.test_config,
+        ADMISSION_CONTROL       = True,
+        ADMISSION_BUDGETS       = {'timeilne' : 0},
+        ADMISSION_RETRY_AFTER   = 2
+    ))
+    api = app.test_client()
+
+    resp = api.get('/timeline/1')
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '2'
+
+    assert api.get('/ping').status_code == 200
+    assert api.get('/profile-picture/1').status_code == 404
+
+@mock.patch('app.create_s3_client')
+def test_admission_ignores_failed_logins(mock_create_s3_client):
+    app = create_app(dict(
+        config.test_config,
+        ADMISSION_CONTROL           = True,
+        ADMISSION_INITIAL_LIMIT     = 10,
+        ADMISSION_LATENCY_TARGET    = 60
+    ))
+    api = app.test_client()
+
+    for _ in range(5):
+        resp = api.post(
+            '/login',
+            data            = json.dumps({
+                'email'     : 'messi@',
+                'password'  : 'wrong'
+            }),
+            content_type    = 'application/json'
+        )
+        assert resp.status_code == 401
+
+    assert app.extensions['admission'].limit == 10
+
+def test_asgi_tweet():
+    asyncio = pytest.importorskip('asyncio')
+    pytest.importorskip('quart')
+    pytest.importorskip('aiomysql')
+    from asgi import create_asgi_app
+
+    async def run():
+        app = create_asgi_app(config.test_config)
+
+        async with app.test_app() as test_app:
+            api = test_app.test_client()
+
+            resp = await api.post('/login', json = {
+                'email'     : 'messi@',
+                'password'  : 'pw'
+            })
+            access_token = (await resp.get_json())['access_token']
+
+            resp = await api.post(
+                '/tweet',
+                json    = {'tweet' : 'hi naldo'},
+                headers = {'Authorization' : access_token}
+            )
+            assert resp.status_code == 200
+
+            resp = await api.get('/timeline', headers = {'Authorization' : access_token})
+            assert resp.status_code == 200
+            assert await resp.get_json() == {
+                'user_id'       : 1,
+                'timeline'      : [
+                    {
+                        'id'        : 2,
+                        'user_id'   : 1,
+                        'tweet'     : 'hi naldo'
+                    }
+                ],
+                'next_cursor'   : None
+            }
+
+            resp = await api.post(
+                '/follows',
+                json    = {'follow' : [2, 1, 99]},
+                headers = {'Authorization' : access_token}
+            )
+            assert (await resp.get_json())['results'] == {
+                '2'     : 'followed',
+                '1'     : 'self',
+                '99'    : 'not_found'
+            }
+
+            resp = await api.get('/timeline', headers = {'Authorization' : access_token})
+            assert [tweet['id'] for tweet in (await resp.get_json())['timeline']] == [2, 1]
+
+    asyncio.run(run())
+
+def test_asgi_rejects_unsupported_config():
+    pytest.importorskip('quart')
+    pytest.importorskip('aiomysql')
+    from asgi import create_asgi_app
+
+    with pytest.raises(ValueError):
+        create_asgi_app(dict(config.test_config, TIMELINE_FANOUT=True))
@@ -1,17 +1,55 @@
-import jwt 
+import time
+import hashlib
+from metrics        import stats_collector
 from flask.json     import JSONEncoder
 from functools      import wraps
-from flask          import Response, current_app, g, request, jsonify, send_file
+from flask          import Response, current_app, g, request, send_file, stream_with_context
 import json
 from werkzeug.utils import secure_filename
+from service        import LRUCache, PasswordHasherBusy, TweetBufferFull, TweetBufferTimeout
+from .serializer    import create_serializer, default as serializer_default
+from .admission     import AdmissionController, AdmissionRejected
 
 
 
 class CustomJSONEncoder(JSONEncoder):
     def default(self, obj):
-        if isinstance(set,obj):
-            return list(obj)
-        return JSONEncoder.default(self,obj)
+        try:
+            return serializer_default(obj)
+        except TypeError:
+            return JSONEncoder.default(self,obj)
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def json_response(obj, status=200):
+    serializer = current_app.extensions['serializer']
+
+    return Response(serializer.dumps(obj), status=status, mimetype='application/json')
+
+class TokenCache:
+    def __init__(self, maxsize=10000):
+        self.cache      = LRUCache(maxsize)
+        self.secret     = None
+
+    def decode(self, access_token, secret):
+        if secret != self.secret:
+            self.cache.clear()
+            self.secret = secret
+
+        payload = self.cache.get(access_token)
+        if payload is None:
+            import jwt
+
+            payload = jwt.decode(access_token, secret, algorithms=['HS256'])
+            if 'exp' in payload:
+                ttl = payload['exp'] - time.time()
+                if ttl > 0:
+                    self.cache.set(access_token, payload, ttl)
+
+        return payload
 
 ###################
 ## decorator
@@ -20,11 +58,14 @@ class CustomJSONEncoder(JSONEncoder):
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        import jwt
+
         access_token    = request.headers.get('Authorization')
         if access_token is not None:
             try:
-                payload = jwt.decode(access_token, current_app.config['JWT_SECRET_KEY'], 'HS256')
-            except jwt.InvaildTokenError:
+                token_cache = current_app.extensions['token_cache']
+                payload     = token_cache.decode(access_token, current_app.config['JWT_SECRET_KEY'])
+            except jwt.InvalidTokenError:
                 payload = None
 
             if payload is None:
@@ -37,25 +78,135 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def stream_timeline(user_id, tweets, limit, chunk_size=100):
+    # tweets holds up to limit + 1 rows; the extra one only tells whether there is a next page
+    dumps = current_app.extensions['serializer'].dumps
+
+    def generate():
+        yield b'{"user_id":' + dumps(user_id) + b',"timeline":['
+
+        count       = 0
+        last_id     = None
+        next_cursor = None
+        chunk       = []
+        for tweet in tweets:
+            if limit and count == limit:
+                next_cursor = last_id
+                break
+
+            chunk.append(dumps(tweet))
+            count   += 1
+            last_id  = tweet.id
+
+            if len(chunk) == chunk_size:
+                yield (b',' if count > chunk_size else b'') + b','.join(chunk)
+                chunk = []
+        if chunk:
+            yield (b',' if count > len(chunk) else b'') + b','.join(chunk)
+
+        yield b'],"next_cursor":' + dumps(next_cursor) + b'}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 ##########################
 
 def create_endpoints(app, services):
     
     app.json_encoder = CustomJSONEncoder
+    app.extensions['serializer']  = create_serializer(app.config.get('JSON_SERIALIZER', 'auto'))
+    app.extensions['token_cache'] = TokenCache(app.config.get('JWT_CACHE_SIZE', 10000))
+
+    metrics             = services.metrics
+    request_latency     = metrics.histogram('http_request_seconds', 'Request latency', ('endpoint', 'method'))
+    request_count       = metrics.counter('http_requests_total', 'Requests', ('endpoint', 'method', 'status'))
+    request_errors      = metrics.counter('http_request_errors_total', 'Unhandled request errors', ('endpoint', 'method'))
+    metrics.add_collector(stats_collector('token_cache', 'Token cache', app.extensions['token_cache'].cache.stats))
+
+    admission = AdmissionController(
+        initial_limit   = app.config.get('ADMISSION_INITIAL_LIMIT', 2 * app.config.get('DB_POOL_SIZE', 5)),
+        min_limit       = app.config.get('ADMISSION_MIN_LIMIT', 1),
+        max_limit       = app.config.get('ADMISSION_MAX_LIMIT', 100),
+        latency_target  = app.config.get('ADMISSION_LATENCY_TARGET', 0.25),
+        priorities      = app.config.get('ADMISSION_PRIORITIES'),
+        budgets         = app.config.get('ADMISSION_BUDGETS'),
+        retry_after     = app.config.get('ADMISSION_RETRY_AFTER', 1)
+    ) if app.config.get('ADMISSION_CONTROL') else None
+
+    app.extensions['admission'] = admission
+    if admission:
+        metrics.add_collector(stats_collector('admission', 'Admission control', admission.stats))
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.before_request
+    def admit():
+        if admission:
+            g.admission_ticket = admission.acquire(request.endpoint)
+
+    @app.after_request
+    def record_request(response):
+        if 'request_start' in g:
+            endpoint = request.endpoint or 'unknown'
+            request_latency.labels(endpoint, request.method).observe(time.perf_counter() - g.request_start)
+            request_count.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def record_error(exc):
+        if exc is not None:
+            request_errors.labels(request.endpoint or 'unknown', request.method).inc()
+
+    @app.after_request
+    def record_status(response):
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def release_admission(exc):
+        # only server-side failures signal congestion; a storm of 4xx (bad logins) must not shrink the limit
+        if 'admission_ticket' in g:
+            failed = exc is not None or g.get('response_status', 500) >= 500
+            admission.release(g.pop('admission_ticket'), failed=failed)
 
     user_service    = services.user_service
     tweet_service  = services.tweet_service
 
+    @app.errorhandler(PasswordHasherBusy)
+    def password_hasher_busy(e):
+        return '', 503, {'Retry-After' : app.config.get('PASSWORD_HASH_RETRY_AFTER', 1)}
+
+    @app.errorhandler(AdmissionRejected)
+    def admission_rejected(e):
+        return '', 503, {'Retry-After' : e.retry_after}
+
+    @app.errorhandler(TweetBufferFull)
+    def tweet_buffer_full(e):
+        return '', 503, {'Retry-After' : 1}
+
+    @app.errorhandler(TweetBufferTimeout)
+    def tweet_buffer_timeout(e):
+        return '', 202
+
     @app.route('/ping', methods=['get'])
     def ping():
         return 'pong'
 
+    @app.route('/metrics', methods=['get'])
+    def export_metrics():
+        return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/db-pool', methods=['get'])
+    def db_pool():
+        return json_response(services.db_pool.stats())
+
     @app.route('/sign-up', methods=['post'])
     def sign_up():
         new_user        = request.json
         new_user        = user_service.create_new_user(new_user)
 
-        return jsonify(new_user)
+        return json_response(new_user)
 
     @app.route('/login', methods=['post'])
     def login():
@@ -65,12 +216,12 @@ def create_endpoints(app, services):
         if authorized:
             token   = user_service.generate_access_token(user_id)
 
-            return jsonify({
+            return json_response({
                 'user_id'   : user_id,
                 'access_token'  : token
             })
         else:
-            '', 401
+            return '', 401
 
     @app.route('/tweet', methods=['post'])
     @login_required
@@ -85,6 +236,20 @@ def create_endpoints(app, services):
 
         return '', 200
 
+    @app.route('/tweets', methods=['post'])
+    @login_required
+    def bulk_tweet():
+        payload         = request.json
+        tweets          = payload['tweets']
+        user_id         = g.user_id
+
+        if len(tweets) > app.config.get('BULK_TWEET_LIMIT', 10000):
+            return 'too many tweets', 400
+
+        results = tweet_service.tweets(user_id, tweets)
+
+        return json_response({'results' : results})
+
     @app.route('/follow', methods=['post'])
     @login_required
     def follow():
@@ -107,23 +272,79 @@ def create_endpoints(app, services):
         
         return '',200
 
+    def timeline_response(user_id):
+        before                  = request.args.get('before', type=int)
+        limit                   = request.args.get('limit', type=int)
+        stream                  = bool(request.args.get('stream'))
+
+        if request.args.get('with_pictures') and not stream:
+            timeline, next_cursor   = tweet_service.timeline(user_id, before, limit)
+            pictures                = user_service.get_profile_pictures(tweet.user_id for tweet in timeline)
+
+            return json_response({
+                'user_id'           : user_id,
+                'timeline'          : timeline,
+                'next_cursor'       : next_cursor,
+                'profile_pictures'  : pictures
+            })
+
+        etag, last_modified     = tweet_service.timeline_version(user_id, before, limit, stream)
+
+        if request.if_none_match.contains_weak(etag):
+            response = not_modified(etag)
+        elif stream:
+            response = stream_timeline(user_id, tweet_service.stream_timeline(user_id, before, limit), limit)
+        else:
+            timeline, next_cursor   = tweet_service.timeline(user_id, before, limit)
+            response                = json_response({
+                'user_id'       : user_id,
+                'timeline'      : timeline,
+                'next_cursor'   : next_cursor
+            })
+
+        response.set_etag(etag, weak=True)
+        response.last_modified          = last_modified
+        response.cache_control.no_cache = True
+        return response
+
+    @app.route('/follows', methods=['post'])
+    @login_required
+    def bulk_follow():
+        payload         = request.json
+        follow_ids      = payload['follow']
+        user_id         = g.user_id
+
+        if len(follow_ids) > app.config.get('FOLLOW_BATCH_LIMIT', 100):
+            return 'too many users', 400
+
+        results = user_service.follows(user_id, follow_ids)
+
+        return json_response({'results' : results})
+
+    @app.route('/unfollows', methods=['post'])
+    @login_required
+    def bulk_unfollow():
+        payload         = request.json
+        unfollow_ids    = payload['unfollow']
+        user_id         = g.user_id
+
+        if len(unfollow_ids) > app.config.get('FOLLOW_BATCH_LIMIT', 100):
+            return 'too many users', 400
+
+        results = user_service.unfollows(user_id, unfollow_ids)
+
+        return json_response({'results' : results})
+
     @app.route('/timeline/<int:user_id>', methods=['get'])
     def timeilne(user_id):
-        timeline        = tweet_service.timeline(user_id)
+        return timeline_response(user_id)
 
-        return jsonify({
-            'user_id'       : user_id,
-            'timeline'      : timeline
-        })
     @app.route('/timeline', methods=['get'])
     @login_required
     def user_timeline():
-        timeline        = tweet_service.timeline(g.user_id)
-
-        return {
-            'user_id'       : g.user_id,
-            'timeline'      : timeline
-        }
+        response = timeline_response(g.user_id)
+        response.cache_control.private = True
+        return response
 
     @app.route('/profile-picture', methods=['post'])
     @login_required
@@ -139,17 +360,50 @@ def create_endpoints(app, services):
         if profile_pic.filename == '':
             return 'file is missing', 404
 
-        filename = secure_filename(profile_pic.filename)
-        user_service.save_profile_picture(profile_pic, filename, user_id)
+        filename    = secure_filename(profile_pic.filename)
+        upload_id   = user_service.upload_profile_picture(profile_pic, filename, user_id)
+
+        if upload_id is not None:
+            return json_response({'upload_id' : upload_id}, 202)
 
         return '', 200
 
+    @app.route('/profile-picture/uploads/<int:upload_id>', methods=['get'])
+    @login_required
+    def get_profile_picture_upload(upload_id):
+        upload = user_service.get_profile_picture_upload(upload_id)
+
+        if upload is None or upload['user_id'] != g.user_id:
+            return '', 404
+
+        return json_response(upload)
+
     
+    @app.route('/profile-pictures', methods=['get'])
+    def get_profile_pictures():
+        try:
+            user_ids = [int(user_id) for user_id in request.args.get('ids', '').split(',') if user_id]
+        except ValueError:
+            return 'invalid ids', 400
+
+        if not user_ids or len(user_ids) > app.config.get('PROFILE_PICTURE_BATCH_LIMIT', 100):
+            return 'invalid ids', 400
+
+        return json_response({'profile_pictures' : user_service.get_profile_pictures(user_ids)})
+
     @app.route('/profile-picture/<int:user_id>', methods=['get'])
     def get_profile_picture(user_id):
         profile_picture = user_service.get_profile_picture(user_id)
 
         if profile_picture:
-            return jsonify({'img_url': profile_picture}) 
+            etag = hashlib.sha1(profile_picture.encode('utf-8')).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = not_modified(etag)
+            else:
+                response = json_response({'img_url': profile_picture})
+
+            response.set_etag(etag, weak=True)
+            response.cache_control.no_cache = True
+            return response
         else:
             return '',404
@@ -0,0 +1,111 @@
+import threading
+import time
+
+CRITICAL    = 0
+HIGH        = 1
+NORMAL      = 2
+LOW         = 3
+
+# endpoint name -> priority; anything not listed is NORMAL. CRITICAL skips the limiter
+# and is kept to endpoints that never touch the DB pool
+DEFAULT_PRIORITIES = {
+    'ping'                  : CRITICAL,
+    'export_metrics'        : CRITICAL,
+    'db_pool'               : CRITICAL,
+    'login'                 : HIGH,
+    'bulk_tweet'            : LOW,
+    'bulk_follow'           : LOW,
+    'bulk_unfollow'         : LOW,
+    'get_profile_pictures'  : LOW
+}
+
+# share of the adaptive limit each priority may fill: HIGH keeps headroom above it, LOW is shed first
+PRIORITY_SHARE = {
+    HIGH    : 1.5,
+    NORMAL  : 1.0,
+    LOW     : 0.5
+}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        initial_limit   = 10,
+        min_limit       = 1,
+        max_limit       = 100,
+        latency_target  = 0.25,
+        backoff         = 0.9,
+        priorities      = None,
+        budgets         = None,
+        retry_after     = 1
+    ):
+        self.limit              = float(initial_limit)
+        self.min_limit          = min_limit
+        self.max_limit          = max_limit
+        self.latency_target     = latency_target
+        self.backoff            = backoff
+        self.priorities         = dict(DEFAULT_PRIORITIES, **(priorities or {}))
+        self.budgets            = budgets or {}
+        self.retry_after        = retry_after
+        self.inflight           = 0
+        self.endpoint_inflight  = {}
+        self.admitted           = 0
+        self.rejected           = 0
+        self.last_decrease      = 0.0
+        self.lock               = threading.Lock()
+
+    def acquire(self, endpoint):
+        priority = self.priorities.get(endpoint, NORMAL)
+        if priority == CRITICAL:
+            return None
+
+        with self.lock:
+            running = self.endpoint_inflight.get(endpoint, 0)
+            budget  = self.budgets.get(endpoint)
+
+            if self.inflight >= self.limit * PRIORITY_SHARE[priority] or (budget is not None and running >= budget):
+                self.rejected += 1
+                raise AdmissionRejected(self.retry_after)
+
+            self.inflight                   += 1
+            self.admitted                   += 1
+            self.endpoint_inflight[endpoint] = running + 1
+
+        return endpoint, time.perf_counter()
+
+    def release(self, ticket, failed=False):
+        if ticket is None:
+            return
+
+        endpoint, started   = ticket
+        latency             = time.perf_counter() - started
+
+        with self.lock:
+            self.inflight                   -= 1
+            self.endpoint_inflight[endpoint] -= 1
+            self.update_limit(latency, failed)
+
+    def update_limit(self, latency, failed):
+        # AIMD: back off multiplicatively on slow or failed requests, grow by ~1 per limit's worth of fast ones
+        if failed or latency > self.latency_target:
+            now = time.monotonic()
+            # one slow burst drains many requests at once; count it as a single congestion signal
+            if now - self.last_decrease >= self.latency_target:
+                self.limit          = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease  = now
+        elif (self.inflight + 1) * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def stats(self):
+        return {
+            'limit'     : self.limit,
+            'inflight'  : self.inflight,
+            'admitted'  : self.admitted,
+            'rejected'  : self.rejected
+        }
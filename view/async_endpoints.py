@@ -0,0 +1,278 @@
+import time
+import hashlib
+
+from functools      import wraps
+from quart          import Response, current_app, g, request
+from werkzeug.utils import secure_filename
+from service        import PasswordHasherBusy
+from .              import TokenCache
+from .serializer    import create_serializer
+
+
+def not_modified(etag):
+    response = Response('', status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def json_response(obj, status=200):
+    serializer = current_app.extensions['serializer']
+
+    return Response(serializer.dumps(obj), status=status, mimetype='application/json')
+
+def login_required(f):
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        import jwt
+
+        access_token    = request.headers.get('Authorization')
+        if access_token is None:
+            return Response('', status=401)
+
+        try:
+            token_cache = current_app.extensions['token_cache']
+            payload     = token_cache.decode(access_token, current_app.config['JWT_SECRET_KEY'])
+        except jwt.InvalidTokenError:
+            return Response('', status=401)
+
+        g.user_id = payload['user_id']
+        return await f(*args, **kwargs)
+    return decorated_function
+
+##########################
+
+def create_async_endpoints(app, services):
+
+    app.extensions['serializer']  = create_serializer(app.config.get('JSON_SERIALIZER', 'auto'))
+    app.extensions['token_cache'] = TokenCache(app.config.get('JWT_CACHE_SIZE', 10000))
+
+    metrics             = services.metrics
+    request_latency     = metrics.histogram('http_request_seconds', 'Request latency', ('endpoint', 'method'))
+    request_count       = metrics.counter('http_requests_total', 'Requests', ('endpoint', 'method', 'status'))
+
+    @app.before_request
+    async def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    async def record_request(response):
+        if 'request_start' in g:
+            endpoint = request.endpoint or 'unknown'
+            request_latency.labels(endpoint, request.method).observe(time.perf_counter() - g.request_start)
+            request_count.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.errorhandler(PasswordHasherBusy)
+    async def password_hasher_busy(e):
+        return '', 503, {'Retry-After' : app.config.get('PASSWORD_HASH_RETRY_AFTER', 1)}
+
+    # services are built once the event loop is running (before_serving), so look them up per request
+
+    @app.route('/ping', methods=['GET'])
+    async def ping():
+        return 'pong'
+
+    @app.route('/metrics', methods=['GET'])
+    async def export_metrics():
+        return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/db-pool', methods=['GET'])
+    async def db_pool():
+        pool = services.db_pool
+
+        return json_response({
+            'size'          : pool.size,
+            'checked_out'   : pool.size - pool.freesize,
+            'max_size'      : pool.maxsize
+        })
+
+    @app.route('/sign-up', methods=['POST'])
+    async def sign_up():
+        new_user        = await request.get_json()
+        new_user        = await services.user_service.create_new_user(new_user)
+
+        return json_response(new_user)
+
+    @app.route('/login', methods=['POST'])
+    async def login():
+        credential              = await request.get_json()
+        authorized, user_id     = await services.user_service.login(credential)
+
+        if not authorized:
+            return '', 401
+
+        return json_response({
+            'user_id'       : user_id,
+            'access_token'  : services.user_service.generate_access_token(user_id)
+        })
+
+    @app.route('/tweet', methods=['POST'])
+    @login_required
+    async def tweet():
+        payload         = await request.get_json()
+
+        result = await services.tweet_service.tweet(g.user_id, payload['tweet'])
+        if result is None:
+            return '300자 초과', 400
+
+        return '', 200
+
+    @app.route('/tweets', methods=['POST'])
+    @login_required
+    async def bulk_tweet():
+        payload         = await request.get_json()
+        tweets          = payload['tweets']
+
+        if len(tweets) > app.config.get('BULK_TWEET_LIMIT', 10000):
+            return 'too many tweets', 400
+
+        results = await services.tweet_service.tweets(g.user_id, tweets)
+
+        return json_response({'results' : results})
+
+    @app.route('/follow', methods=['POST'])
+    @login_required
+    async def follow():
+        payload         = await request.get_json()
+
+        await services.user_service.follow(g.user_id, payload['follow'])
+
+        return '', 200
+
+    @app.route('/unfollow', methods=['POST'])
+    @login_required
+    async def unfollow():
+        payload         = await request.get_json()
+
+        await services.user_service.unfollow(g.user_id, payload['unfollow'])
+
+        return '', 200
+
+    @app.route('/follows', methods=['POST'])
+    @login_required
+    async def bulk_follow():
+        payload         = await request.get_json()
+        follow_ids      = payload['follow']
+
+        if len(follow_ids) > app.config.get('FOLLOW_BATCH_LIMIT', 100):
+            return 'too many users', 400
+
+        results = await services.user_service.follows(g.user_id, follow_ids)
+
+        return json_response({'results' : results})
+
+    @app.route('/unfollows', methods=['POST'])
+    @login_required
+    async def bulk_unfollow():
+        payload         = await request.get_json()
+        unfollow_ids    = payload['unfollow']
+
+        if len(unfollow_ids) > app.config.get('FOLLOW_BATCH_LIMIT', 100):
+            return 'too many users', 400
+
+        results = await services.user_service.unfollows(g.user_id, unfollow_ids)
+
+        return json_response({'results' : results})
+
+    async def timeline_response(user_id):
+        tweet_service           = services.tweet_service
+        before                  = request.args.get('before', type=int)
+        limit                   = request.args.get('limit', type=int)
+
+        if request.args.get('with_pictures'):
+            timeline, next_cursor   = await tweet_service.timeline(user_id, before, limit)
+            pictures                = await services.user_service.get_profile_pictures(tweet.user_id for tweet in timeline)
+
+            return json_response({
+                'user_id'           : user_id,
+                'timeline'          : timeline,
+                'next_cursor'       : next_cursor,
+                'profile_pictures'  : pictures
+            })
+
+        etag, last_modified     = await tweet_service.timeline_version(user_id, before, limit, False)
+
+        if request.if_none_match.contains_weak(etag):
+            response = not_modified(etag)
+        else:
+            timeline, next_cursor   = await tweet_service.timeline(user_id, before, limit)
+            response                = json_response({
+                'user_id'       : user_id,
+                'timeline'      : timeline,
+                'next_cursor'   : next_cursor
+            })
+
+        response.set_etag(etag, weak=True)
+        response.last_modified          = last_modified
+        response.cache_control.no_cache = True
+        return response
+
+    @app.route('/timeline/<int:user_id>', methods=['GET'])
+    async def timeilne(user_id):
+        return await timeline_response(user_id)
+
+    @app.route('/timeline', methods=['GET'])
+    @login_required
+    async def user_timeline():
+        response = await timeline_response(g.user_id)
+        response.cache_control.private = True
+        return response
+
+    @app.route('/profile-picture', methods=['POST'])
+    @login_required
+    async def upload_profile_picture():
+        files = await request.files
+
+        if 'profile_pic' not in files:
+            return 'file is missing', 404
+
+        profile_pic = files['profile_pic']
+
+        if profile_pic.filename == '':
+            return 'file is missing', 404
+
+        filename    = secure_filename(profile_pic.filename)
+        upload_id   = await services.user_service.upload_profile_picture(profile_pic, filename, g.user_id)
+
+        if upload_id is not None:
+            return json_response({'upload_id' : upload_id}, 202)
+
+        return '', 200
+
+    @app.route('/profile-picture/uploads/<int:upload_id>', methods=['GET'])
+    @login_required
+    async def get_profile_picture_upload(upload_id):
+        upload = await services.user_service.get_profile_picture_upload(upload_id)
+
+        if upload is None or upload['user_id'] != g.user_id:
+            return '', 404
+
+        return json_response(upload)
+
+    @app.route('/profile-pictures', methods=['GET'])
+    async def get_profile_pictures():
+        try:
+            user_ids = [int(user_id) for user_id in request.args.get('ids', '').split(',') if user_id]
+        except ValueError:
+            return 'invalid ids', 400
+
+        if not user_ids or len(user_ids) > app.config.get('PROFILE_PICTURE_BATCH_LIMIT', 100):
+            return 'invalid ids', 400
+
+        return json_response({'profile_pictures' : await services.user_service.get_profile_pictures(user_ids)})
+
+    @app.route('/profile-picture/<int:user_id>', methods=['GET'])
+    async def get_profile_picture(user_id):
+        profile_picture = await services.user_service.get_profile_picture(user_id)
+
+        if not profile_picture:
+            return '', 404
+
+        etag = hashlib.sha1(profile_picture.encode('utf-8')).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            response = not_modified(etag)
+        else:
+            response = json_response({'img_url': profile_picture})
+
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+        return response
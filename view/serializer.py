@@ -0,0 +1,53 @@
+import datetime
+import decimal
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if hasattr(obj, '_asdict'):
+        return obj._asdict()
+    if hasattr(obj, 'keys'):
+        return {key : obj[key] for key in obj.keys()}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONSerializer:
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class OrjsonSerializer:
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+
+SERIALIZERS = {
+    'json'      : JSONSerializer,
+    'orjson'    : OrjsonSerializer
+}
+
+def available_serializers():
+    return [name for name in SERIALIZERS if name != 'orjson' or orjson is not None]
+
+def create_serializer(name='auto'):
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name not in available_serializers():
+        raise ValueError(f"JSON serializer '{name}' is not available")
+
+    return SERIALIZERS[name]()